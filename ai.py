@@ -1,32 +1,64 @@
-import copy
-import itertools
-import math
-from math import floor
-from random import shuffle
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Queue
+from threading import Thread
 from time import time
 from tkinter import Tk, Checkbutton, IntVar, NW, Frame, Label
 
-from backtrack import backtrack
+from engine import MinesweeperEngine
 from gui import MinesweeperGui
+from metrics import Metrics
+from replay import MoveLog
 
 DEFAULT_AUTO_FLAG = 1
 DEFAULT_AUTO_REVEAL = 1
+DEFAULT_AUTO_DEDUCE = 1
 DEFAULT_AUTO_CONSTRAINT = 0
-DEFAULT_RANDOM_REVEAL = 0
-
-SHUFFLE = False
+DEFAULT_GUESS_REVEAL = 0
 
 SHOW_CONSTRAINED = True
+# Solve the constraint components of a move over all cores
+PARALLEL_SOLVING = True
+# Play all the certain moves of a step in one tick
+BATCH_MOVES = True
+# Time every stage and print the totals of the session at the end of a game
+COLLECT_METRICS = False
+# File the moves of every game, by hand or by the AI, are appended to
+MOVE_LOG = None
 CONSTRAINED_COLOR = '#FFFFCC'
 WORKING_COLOR = '#FFFF00'
 
-CHUNK_SIZE = 12
+# Seconds a move may search for before settling for what it found
+MOVE_DEADLINE = 2.0
+POLL_INTERVAL = 1
+IDLE_INTERVAL = 100
+
+
+class Move(object):
+    """A step played by the worker thread, until it is done, cancelled or past its deadline."""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.cancelled = False
+        self.actions = []
+
+    def is_late(self):
+        return time() > self.deadline
+
+    def is_interrupted(self):
+        return self.cancelled or self.is_late()
 
 
-class MinesweeperAi(object):
+class MinesweeperAi(MinesweeperEngine):
     def __init__(self, master):
+        super(MinesweeperAi, self).__init__(
+            verbose=True, executor=ProcessPoolExecutor() if PARALLEL_SOLVING else None, batch=BATCH_MOVES)
         self.root = master
         self.gui = MinesweeperGui(self.root)
+        if COLLECT_METRICS:
+            self.metrics = Metrics()
+        if MOVE_LOG:
+            self.gui.move_log = MoveLog(open(MOVE_LOG, 'ab'))
 
         self.ai_frame = Frame(self.root)
         self.ai_frame.grid(row=0, rowspan=2, column=3, padx=10, pady=10)
@@ -37,239 +69,132 @@ class MinesweeperAi(object):
         Checkbutton(self.ai_frame, text="Auto flag", variable=self.auto_flag).grid(row=1, sticky=NW)
         self.auto_reveal = IntVar(value=DEFAULT_AUTO_REVEAL)
         Checkbutton(self.ai_frame, text="Auto reveal", variable=self.auto_reveal).grid(row=2, sticky=NW)
+        self.auto_deduce = IntVar(value=DEFAULT_AUTO_DEDUCE)
+        Checkbutton(self.ai_frame, text="Linear deduction", variable=self.auto_deduce).grid(row=3, sticky=NW)
         self.auto_constraints = IntVar(value=DEFAULT_AUTO_CONSTRAINT)
-        Checkbutton(self.ai_frame, text="Resolve constraints", variable=self.auto_constraints).grid(row=3, sticky=NW)
-        self.random_reveal = IntVar(value=DEFAULT_RANDOM_REVEAL)
-        Checkbutton(self.ai_frame, text="Random reveal", variable=self.random_reveal).grid(row=4, sticky=NW)
-
-        self.game = None
-        self.board = None
-        self.end_ts = floor(time() * 1000)
-        self.backtracking_count = 0
-        self.random_hit_count = 0
-        self.pending_hit_count = 0
-        self.is_done = False
-
-        self.pending_mines = set()
-        self.pending_reveals = set()
+        Checkbutton(self.ai_frame, text="Resolve constraints", variable=self.auto_constraints).grid(row=4, sticky=NW)
+        self.guess_reveal = IntVar(value=DEFAULT_GUESS_REVEAL)
+        Checkbutton(self.ai_frame, text="Guess reveal", variable=self.guess_reveal).grid(row=5, sticky=NW)
+
+        self.stage_variables = {
+            'flag': self.auto_flag,
+            'reveal': self.auto_reveal,
+            'deduce': self.auto_deduce,
+            'constraints': self.auto_constraints,
+            'guess': self.guess_reveal,
+        }
+
+        self.finished = False
+        self.enabled_stages = set()
+        self.move = None
+        self.results = Queue()
+        self.requests = Queue()
+        Thread(target=self.work, daemon=True).start()
+
+    def is_enabled(self, stage):
+        return stage in self.enabled_stages
+
+    def reveal(self, cell):
+        self.move_count += 1
+        self.move.actions.append(('reveal', cell, self.stage))
+
+    def flag(self, cell):
+        self.move_count += 1
+        self.move.actions.append(('flag', cell, self.stage))
+
+    def show_constrained(self, constrained, working=False):
+        if SHOW_CONSTRAINED:
+            self.results.put((self.move, 'show', (list(constrained), working)))
+
+    def work(self):
+        """Play the engine steps requested by the Tk loop, the moves they make are applied once they are done."""
+        while True:
+            move = self.requests.get()
+            stage = None
+            try:
+                stage = self.step()
+            except Exception:
+                traceback.print_exc()
+            self.results.put((move, 'done', stage))
 
     def run(self):
-        start_ts = floor(time() * 1000)
-        # print("Time since last frame: {} ms".format(start_ts - self.end_ts))
-
-        self.handle_new_games()
-
-        if self.handle_wins():
-            return
-
-        changed = self.handle_pending_hits()
-
-        if self.auto_flag.get() and not changed:
-            changed = self.flag_obvious_spots()
-            step = 'flag'
-
-        if self.auto_reveal.get() and not changed:
-            changed = self.reveal_obvious_spots()
-            step = 'reveal'
-
-        if self.auto_constraints.get() and not changed:
-            changed = self.resolve_constraints()
-            if changed:
-                self.backtracking_count += 1
-            step = 'random'
-
-        if self.random_reveal.get() and not changed:
-            self.random_guess()
-            self.random_hit_count += 1
-            step = 'random'
-
-        self.end_ts = floor(time() * 1000)
-        elapsed = self.end_ts - start_ts
-        # print("Step '{}' frame time: {} ms".format(step, elapsed))
-
-        if changed:
-            self.ai_status['text'] = 'AI is working'
-            next_in = 1
-        else:
+        next_in = POLL_INTERVAL
+        if self.move is None:
+            self.handle_new_games()
+            if self.handle_wins():
+                return
+            self.start_move()
+        elif self.gui.game != self.game:
+            # The search finds out at its next interruption check and its moves are dropped
+            self.move.cancelled = True
+        elif self.move.is_late():
+            self.ai_status['text'] = 'AI is late'
+
+        if self.handle_results() is None:
             self.ai_status['text'] = 'AI is idle'
-            next_in = 100
+            next_in = IDLE_INTERVAL
         self.root.after(next_in, self.run)
 
+    def start_move(self):
+        self.enabled_stages = set(stage for stage, variable in self.stage_variables.items() if variable.get())
+        self.move = Move(time() + MOVE_DEADLINE)
+        self.interrupt = self.move.is_interrupted
+        self.ai_status['text'] = 'AI is working'
+        # The worker reads the board and the frontier while it plays, clicks wait until it is done
+        self.gui.lock()
+        self.requests.put(self.move)
+
+    def handle_results(self):
+        """Apply what the worker handed back and return the stage of the finished step, 'working' before that."""
+        while True:
+            try:
+                move, kind, value = self.results.get_nowait()
+            except Empty:
+                return 'working'
+
+            if move.cancelled:
+                if kind == 'done':
+                    self.move = None
+                    self.gui.unlock()
+                continue
+            if kind == 'done':
+                # Checked as they are played, a reveal may open cells queued after it, and flags toggle
+                self.gui.play((action, cell.x, cell.y, stage) for action, cell, stage in move.actions
+                              if (cell.is_playable() if action == 'flag' else not cell.is_revealed()))
+                self.move = None
+                self.gui.unlock()
+                return value
+            if kind == 'show':
+                cells, working = value
+                color = WORKING_COLOR if working else CONSTRAINED_COLOR
+                for cell in cells:
+                    self.gui.highlight_cell(cell, color)
+
     def handle_new_games(self):
         if self.gui.game != self.game:
             if self.game:
                 print('New game started!')
-            self.game = self.gui.game
-            self.board = self.gui.game.board
-            self.is_done = False
+            self.set_game(self.gui.game)
+            self.finished = False
 
         if self.gui.game.board != self.board:
             raise Exception('Board has changed during a game')
 
     def handle_wins(self):
-        if self.game.is_won() or self.game.is_lost():
-            if not self.is_done:
-                print('pending: {}, backtracking: {}, random: {}'.format(
-                    self.pending_hit_count, self.backtracking_count, self.random_hit_count))
-                self.is_done = True
+        if self.is_done():
+            if not self.finished:
+                print('pending: {}, deductions: {}, backtracking: {}, guesses: {}, cache hit rate: {:.0%}'.format(
+                    self.pending_hit_count, self.deduction_count, self.backtracking_count, self.guess_count,
+                    self.cache.stats()['hit_rate']))
+                if self.metrics is not None:
+                    print(self.metrics.format_table())
+                if self.gui.move_log is not None:
+                    self.gui.move_log.output.flush()
+                self.finished = True
             self.root.after(1000, self.run)
             return True
         return False
 
-    def handle_pending_hits(self):
-        while self.pending_mines:
-            cell = self.pending_mines.pop()
-            if not cell.is_flagged():
-                self.gui.flag(cell.x, cell.y)
-                self.pending_hit_count += 1
-                return True
-
-        while self.pending_reveals:
-            cell = self.pending_reveals.pop()
-            if not cell.is_revealed():
-                self.gui.reveal(cell.x, cell.y)
-                self.pending_hit_count += 1
-                return True
-
-        return False
-
-    def random_guess(self):
-        playable = [_cell for _cell in self.board if _cell.is_playable()]
-        shuffle(playable)
-        cell = playable[0]
-        print('Trying random guess: {}, {}'.format(cell.x, cell.y))
-        self.gui.reveal(cell.x, cell.y)
-
-    def flag_obvious_spots(self):
-        board = [_cell for _cell in self.board if _cell.is_revealed() and _cell.status() != 0]
-        if SHUFFLE:
-            shuffle(board)
-        for cell in board:
-            playable = [_cell for _cell in cell.get_surroundings() if _cell.is_playable()]
-            flagged = [_cell for _cell in cell.get_surroundings() if _cell.is_flagged()]
-
-            if cell.status() > len(flagged) and len(playable) == cell.status() - len(flagged):
-                for _cell in playable:
-                    self.pending_mines.add(_cell)
-
-        # Handle one hit
-        changed = self.handle_pending_hits()
-        if changed:
-            return True
-
-        return False
-
-    def reveal_obvious_spots(self):
-        # print('Revealing obvious spots')
-        board = [_cell for _cell in self.board if _cell.is_revealed() and _cell.status() != 0]
-        if SHUFFLE:
-            shuffle(board)
-        for cell in board:
-            playable = [_cell for _cell in cell.get_surroundings() if _cell.is_playable()]
-            flagged = [_cell for _cell in cell.get_surroundings() if _cell.is_flagged()]
-
-            if cell.status() == len(flagged):
-                for _cell in playable:
-                    self.pending_reveals.add(_cell)
-
-        # Handle one hit
-        changed = self.handle_pending_hits()
-        if changed:
-            return True
-
-        return False
-
-    @staticmethod
-    def candidate_generator(constrained_cells, max_mines):
-        for mine_count in range(0, max_mines):
-            for candidate in itertools.combinations(constrained_cells, mine_count):
-                yield list(candidate)
-
-    @staticmethod
-    def is_in_local_constraint(cell, local_constraint):
-        for _cell in local_constraint:
-            cell_revealed_surroundings = [c for c in cell.get_surroundings() if c.is_revealed()]
-            _cell_revealed_surroundings = [c for c in _cell.get_surroundings() if c.is_revealed()]
-            if set(cell_revealed_surroundings).intersection(set(_cell_revealed_surroundings)):
-                return True
-        return False
-
-    def resolve_constraints(self):
-        local_constraint_groups = self.build_local_constraint_groups()
-
-        if not local_constraint_groups:
-            return False
-
-        while local_constraint_groups:
-            solutions = []
-            candidate = []
-            constrained = list(local_constraint_groups.pop())
-
-            if SHOW_CONSTRAINED:
-                self.show_constrained(constrained, WORKING_COLOR)
-
-            print('group length: {}'.format(len(constrained)))
-            backtrack(solutions, constrained, candidate)
-
-            if solutions:
-                density_vector = list(map(sum, zip(*solutions)))
-                for cell_index in range(len(constrained)):
-                    if density_vector[cell_index] == len(solutions):
-                        self.pending_mines.add(constrained[cell_index])
-                    elif density_vector[cell_index] == 0:
-                        self.pending_reveals.add(constrained[cell_index])
-
-            # Handle one hit
-            changed = self.handle_pending_hits()
-            if changed:
-                return True
-
-        return False
-
-    def show_constrained(self, constrained, color=CONSTRAINED_COLOR):
-        for cell in constrained:
-            if self.gui.canvas.itemcget(cell.object_ids[0], 'fill') != color:
-                cell.updated = True
-                self.gui.canvas.itemconfigure(cell.object_ids[0], fill=color)
-        self.gui.root.update()
-
-    def build_local_constraint_groups(self):
-        constrained = set(_cell for _cell in self.board if _cell.is_constrained())
-
-        previous_constraints = getattr(self, 'previous_constraints', None)
-
-        if previous_constraints == constrained:
-            return None
-
-        setattr(self, 'previous_constraints', copy.copy(constrained))
-
-        if SHOW_CONSTRAINED:
-            self.show_constrained(constrained)
-
-        local_constraint_groups = []
-        while len(constrained) > 0:
-            local_group = {constrained.pop()}
-            added = True
-            while added:
-                added = False
-                for _cell in constrained:
-                    if self.is_in_local_constraint(_cell, local_group):
-                        local_group.add(_cell)
-                        added = True
-                constrained = constrained.difference(local_group)
-
-            local_group = list(local_group)
-            group_len = len(local_group)
-            if group_len > CHUNK_SIZE:
-                for chunk_nb in range(math.floor(group_len / CHUNK_SIZE)):
-                    local_constraint_groups.append(local_group[CHUNK_SIZE * chunk_nb:CHUNK_SIZE * (chunk_nb + 1)])
-            else:
-                local_constraint_groups.append(local_group)
-
-        local_constraint_groups = sorted(local_constraint_groups, key=lambda x: len(x), reverse=True)
-
-        return local_constraint_groups
-
 
 if __name__ == '__main__':
     root = Tk()
@@ -1,79 +1,226 @@
-import copy
+from minesweeper import Cell
 
+# Search nodes between two calls to the interrupt callback
+INTERRUPT_INTERVAL = 1024
 
-def backtrack(solutions, constrained_cells, candidate):
-    if reject_candidate(constrained_cells, candidate):
-        return
-    if accept_candidate(constrained_cells, candidate):
-        solutions.append(candidate)
-    extension = generate_first_extension(candidate)
-    while extension is not None:
-        backtrack(solutions, constrained_cells, extension)
-        extension = generate_next_extension(extension)
 
+class SearchInterrupted(Exception):
+    pass
 
-def reject_candidate(constrained_cells, candidate):
-    if len(candidate) > len(constrained_cells):
-        return True
 
-    added_mines = {}
-    played_cells = {}
+def component_constraints(cells):
+    """Describe every revealed cell around a group by the mines it still misses, its hidden neighbours left and the
+    positions of its neighbours in the group.
 
-    for index, is_mine in enumerate(candidate):
-        cell = constrained_cells[index]
+    The description holds plain numbers only, so a search can run on it in another process.
+    """
+    constraint_ids = {}
+    constraints = []
+    for position, cell in enumerate(cells):
         for constraining_cell in cell.get_surroundings():
-            if not constraining_cell.is_revealed():
+            if not constraining_cell.is_revealed() or constraining_cell.status() == Cell.Status.MINE:
                 continue
-            if is_mine and has_all_its_mines(constraining_cell, added_mines.get(constraining_cell, 0)):
-                return True
-            if not is_mine and needs_a_mine(constraining_cell,
-                                            added_mines.get(constraining_cell, 0),
-                                            played_cells.get(constraining_cell, 0)):
-                return True
-
-            added_mines[constraining_cell] = added_mines.get(constraining_cell, 0) + is_mine
-            played_cells[constraining_cell] = played_cells.get(constraining_cell, 0) + 1
-
-    return False
-
-
-def has_all_its_mines(cell, added_mines=0):
-    if not cell.is_revealed():
-        raise Exception('Unable to check if hidden cell has all its mines')
-
-    adjacent_mines = cell.status()
-    current_flags = len([_cell for _cell in cell.get_surroundings() if _cell.is_flagged()])
-
-    return current_flags + added_mines == adjacent_mines
-
-
-def needs_a_mine(cell, added_mines=0, played_cells=0):
-    if not cell.is_revealed():
-        raise Exception('Unable to check if hidden cell has all its mines')
-
-    adjacent_mines = cell.status()
-    current_flags = len([_cell for _cell in cell.get_surroundings() if _cell.is_flagged()])
-
-    hidden_cells = len([_cell for _cell in cell.get_surroundings() if _cell.is_playable()])
-
-    missing_mines = adjacent_mines - current_flags - added_mines
-
-    return missing_mines == hidden_cells - played_cells
-
-
-def accept_candidate(constrained_cells, candidate):
-    return len(candidate) == len(constrained_cells)
-
+            constraint = constraint_ids.get(constraining_cell)
+            if constraint is None:
+                constraint = constraint_ids[constraining_cell] = len(constraints)
+                surroundings = constraining_cell.get_surroundings()
+                flags = sum(1 for _cell in surroundings if _cell.is_flagged())
+                unknown = sum(1 for _cell in surroundings if _cell.is_playable())
+                constraints.append((constraining_cell.status() - flags, unknown, []))
+            constraints[constraint][2].append(position)
+    return constraints
+
+
+class ConstraintSearch(object):
+    """Depth-first search over the mine assignments of a group of constrained cells.
+
+    Every revealed cell around the group is a constraint keeping the number of mines it still misses and the
+    number of its hidden neighbours left unassigned. Both counters are updated on assignment and restored on undo,
+    and constraints left with no choice force their remaining cells. interrupt, when given, is called every
+    INTERRUPT_INTERVAL nodes and stops the search with SearchInterrupted once it returns True.
+    """
+
+    def __init__(self, constrained_cells, constraints=None, interrupt=None):
+        self.cells = list(constrained_cells)
+        self.interrupt = interrupt
+        if constraints is None:
+            constraints = component_constraints(self.cells)
+        self.missing = [missing for missing, _, _ in constraints]
+        self.unknown = [unknown for _, unknown, _ in constraints]
+        self.members = [members for _, _, members in constraints]
+        self.cell_constraints = [[] for _ in self.cells]
+        self.assignment = [None] * len(self.cells)
+        self.trail = []
+        self.nodes = 0
+
+        for constraint, members in enumerate(self.members):
+            for position in members:
+                self.cell_constraints[position].append(constraint)
+
+        self.consistent = all(0 <= missing <= unknown for missing, unknown in zip(self.missing, self.unknown))
+        if self.consistent:
+            self.consistent = self.propagate_constraints(range(len(self.missing)))
+
+    def count_node(self):
+        self.nodes += 1
+        if self.interrupt is not None and not self.nodes % INTERRUPT_INTERVAL and self.interrupt():
+            raise SearchInterrupted()
+
+    def assign(self, position, value):
+        self.assignment[position] = value
+        self.trail.append(position)
+        consistent = True
+        for constraint in self.cell_constraints[position]:
+            self.missing[constraint] -= value
+            self.unknown[constraint] -= 1
+            if not 0 <= self.missing[constraint] <= self.unknown[constraint]:
+                consistent = False
+        return consistent
+
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            position = self.trail.pop()
+            value = self.assignment[position]
+            for constraint in self.cell_constraints[position]:
+                self.missing[constraint] += value
+                self.unknown[constraint] += 1
+            self.assignment[position] = None
+
+    def force(self, constraint):
+        missing = self.missing[constraint]
+        if missing == 0:
+            value = 0
+        elif missing == self.unknown[constraint]:
+            value = 1
+        else:
+            return True
+        for member in self.members[constraint]:
+            if self.assignment[member] is None and not self.assign(member, value):
+                return False
+        return True
 
-def generate_first_extension(candidate):
-    next_candidate = copy.copy(candidate)
-    next_candidate.append(0)
-    return next_candidate
+    def propagate(self, mark):
+        while mark < len(self.trail):
+            for constraint in self.cell_constraints[self.trail[mark]]:
+                if not self.force(constraint):
+                    return False
+            mark += 1
+        return True
 
+    def propagate_constraints(self, constraints):
+        mark = len(self.trail)
+        for constraint in constraints:
+            if not self.force(constraint):
+                return False
+        return self.propagate(mark)
+
+    def try_assign(self, position, value):
+        mark = len(self.trail)
+        self.count_node()
+        return self.assign(position, value) and self.propagate(mark)
+
+    def solutions(self, position=0):
+        while position < len(self.cells) and self.assignment[position] is not None:
+            position += 1
+        if position == len(self.cells):
+            yield self.assignment
+            return
+
+        for value in (0, 1):
+            mark = len(self.trail)
+            if self.try_assign(position, value):
+                yield from self.solutions(position + 1)
+            self.undo(mark)
+
+    def count(self, counts, node_limit=None, position=0):
+        """Add every solution to counts without keeping any, and return False as soon as node_limit is passed."""
+        while position < len(self.cells) and self.assignment[position] is not None:
+            position += 1
+        if position == len(self.cells):
+            counts.add(self.assignment)
+            return True
+
+        for value in (0, 1):
+            mark = len(self.trail)
+            complete = not self.try_assign(position, value) or self.count(counts, node_limit, position + 1)
+            self.undo(mark)
+            if not complete or (node_limit is not None and self.nodes > node_limit):
+                return False
+        return True
 
-def generate_next_extension(candidate):
-    if candidate[-1] == 1:
-        return None
-    next_candidate = copy.copy(candidate)
-    next_candidate[-1] = 1
-    return next_candidate
+    def find_solution(self):
+        mark = len(self.trail)
+        solution = None
+        for assignment in self.solutions():
+            solution = list(assignment)
+            break
+        # Leaving the search early skips its own undo
+        self.undo(mark)
+        return solution
+
+    def random_solutions(self, order, rng, index=0):
+        while index < len(order) and self.assignment[order[index]] is not None:
+            index += 1
+        if index == len(order):
+            yield self.assignment
+            return
+
+        for value in rng.sample((0, 1), 2):
+            mark = len(self.trail)
+            if self.try_assign(order[index], value):
+                yield from self.random_solutions(order, rng, index + 1)
+            self.undo(mark)
+
+    def find_random_solution(self, rng):
+        """Return a solution found assigning the cells in random order and to random values, or None without any."""
+        mark = len(self.trail)
+        solution = None
+        for assignment in self.random_solutions(rng.sample(range(len(self.cells)), len(self.cells)), rng):
+            solution = list(assignment)
+            break
+        self.undo(mark)
+        return solution
+
+    def find_certainties(self):
+        """Return the positions that are mines and safe in every solution, or None without any solution."""
+        if not self.consistent:
+            return None
+        solution = self.find_solution()
+        if solution is None:
+            return None
+
+        seen = [[False, False] for _ in self.cells]
+        for position, value in enumerate(solution):
+            seen[position][value] = True
+
+        for position in range(len(self.cells)):
+            if self.assignment[position] is not None:
+                continue
+            for value in (0, 1):
+                if seen[position][value]:
+                    continue
+                mark = len(self.trail)
+                if self.try_assign(position, value):
+                    solution = self.find_solution()
+                    if solution is not None:
+                        for _position, _value in enumerate(solution):
+                            seen[_position][_value] = True
+                self.undo(mark)
+
+        mines = [position for position, values in enumerate(seen) if not values[0]]
+        safes = [position for position, values in enumerate(seen) if not values[1]]
+        return mines, safes
+
+
+def backtrack(solutions, constrained_cells, candidate=None):
+    search = ConstraintSearch(constrained_cells)
+    if not search.consistent:
+        return
+    for position, is_mine in enumerate(candidate or []):
+        if search.assignment[position] is None:
+            if not search.try_assign(position, is_mine):
+                return
+        elif search.assignment[position] != is_mine:
+            return
+    for solution in search.solutions():
+        solutions.append(list(solution))
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter, strftime
+
+from engine import MinesweeperEngine
+from minesweeper import Minesweeper, DIFFICULTIES
+from noguess import generate_mines
+from probability import count_component
+from solvers import SOLVERS
+
+BOARDS = DIFFICULTIES + (
+    ('Large', 200, 200, 8000),
+    ('Huge', 500, 500, 50000),
+)
+
+# Boards small enough to play whole games on in a reasonable time
+GAME_BOARDS = ('Easy', 'Medium', 'Hard', 'Extreme')
+
+SEED = 0
+POSITIONS = 5
+GAMES = 20
+
+
+def measure(function, repeat, number=1, setup=None):
+    """Return the min, median and mean time of one call to function, over repeat rounds of number calls.
+
+    With setup, every call is given what setup returns, out of the timing. A first call warms up the caches.
+    """
+    times = []
+    for round_index in range(repeat + 1):
+        arguments = [(setup(),) if setup else () for _ in range(number)]
+        start = perf_counter()
+        for _arguments in arguments:
+            function(*_arguments)
+        if round_index:
+            times.append((perf_counter() - start) / number)
+    return {'repeat': repeat, 'number': number, 'min': min(times), 'median': median(times),
+            'mean': sum(times) / len(times)}
+
+
+def record_positions(width, height, mine_count, count, seed=SEED):
+    """Play seeded games with the single cell rules until they get stuck, which leaves a frontier to solve."""
+    positions = []
+    for game_seed in range(seed, seed + count * 4):
+        game = Minesweeper(width, height, mine_count, seed=game_seed, first_click_safe=True)
+        engine = MinesweeperEngine(game, stages=('flag', 'reveal'))
+        game.reveal(width // 2, height // 2)
+        engine.play()
+        if not engine.is_done() and engine.frontier.constrained:
+            positions.append(engine)
+            if len(positions) == count:
+                break
+    return positions
+
+
+def bench_board(label, width, height, mine_count, repeat, seed=SEED):
+    results = []
+
+    def result(name, timing, **extra):
+        entry = {'benchmark': name, 'board': label, 'width': width, 'height': height, 'mines': mine_count}
+        entry.update(extra)
+        entry.update(timing)
+        results.append(entry)
+
+    game = Minesweeper(width, height, mine_count, seed=seed)
+    result('init_board', measure(game.init_board, repeat))
+
+    # Mines are placed around the first reveal in setup, so that only the flood fill is timed
+    result('reveal', measure(lambda _game: _game.reveal(width // 2, height // 2), repeat,
+                             setup=lambda: Minesweeper(width, height, mine_count, seed=seed,
+                                                       safe_cell=(width // 2, height // 2))))
+
+    game = Minesweeper(width, height, mine_count, seed=seed, first_click_safe=True)
+    game.reveal(width // 2, height // 2)
+    result('is_won', measure(game.is_won, repeat, number=100))
+
+    if width * height > 100000:
+        return results
+
+    if label in GAME_BOARDS:
+        rng = random.Random(seed)
+        result('generate_no_guess', measure(
+            lambda: generate_mines(width, height, mine_count, (width // 2, height // 2), rng), repeat))
+
+    positions = record_positions(width, height, mine_count, POSITIONS, seed)
+    groups = []
+    for engine in positions:
+        def build_groups():
+            engine.constraints_version = None
+            return engine.build_local_constraint_groups()
+        result('build_local_constraint_groups', measure(build_groups, repeat), position=positions.index(engine))
+        groups.extend(build_groups())
+
+    for name, solver_class in sorted(SOLVERS.items()):
+        solver = solver_class()
+        result('certainties', measure(lambda: [solver.certainties(group) for group in groups], repeat),
+               solver=name, groups=len(groups), cells=sum(len(group) for group in groups))
+        result('counts', measure(lambda: [count_component(group, search_class=solver.search_class)
+                                          for group in groups], repeat),
+               solver=name, groups=len(groups), cells=sum(len(group) for group in groups))
+    return results
+
+
+def bench_games(label, width, height, mine_count, games, seed=SEED):
+    times = []
+    wins = 0
+    for game_seed in range(seed, seed + games):
+        start = perf_counter()
+        game = Minesweeper(width, height, mine_count, seed=game_seed, first_click_safe=True)
+        engine = MinesweeperEngine(game, rng=random.Random('engine-{}'.format(game_seed)))
+        wins += engine.play()
+        times.append(perf_counter() - start)
+    return [{'benchmark': 'game', 'board': label, 'width': width, 'height': height, 'mines': mine_count,
+             'repeat': games, 'number': 1, 'wins': wins, 'min': min(times), 'median': median(times),
+             'mean': sum(times) / len(times)}]
+
+
+def metadata():
+    try:
+        # The commit of the code measured, wherever the benchmark is run from
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'date': strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'implementation': platform.python_implementation(), 'machine': platform.machine(), 'seed': SEED}
+
+
+def result_key(entry):
+    return tuple(str(entry.get(key)) for key in ('benchmark', 'board', 'position', 'solver'))
+
+
+def compare(previous, current):
+    """Print the median time of every benchmark of current against previous."""
+    before = {result_key(entry): entry for entry in previous['results']}
+    print('{:<32} {:<8} {:>12} {:>12} {:>8}'.format('Benchmark', 'Board', 'Before (ms)', 'After (ms)', 'Ratio'))
+    for entry in current['results']:
+        old = before.get(result_key(entry))
+        name = ' '.join(str(entry[key]) for key in ('benchmark', 'position', 'solver') if key in entry)
+        if old is None:
+            print('{:<32} {:<8} {:>12} {:>12.4f} {:>8}'.format(name, entry['board'], '-', entry['median'] * 1000, '-'))
+            continue
+        ratio = entry['median'] / old['median'] if old['median'] else float('inf')
+        print('{:<32} {:<8} {:>12.4f} {:>12.4f} {:>7.2f}x'.format(
+            name, entry['board'], old['median'] * 1000, entry['median'] * 1000, ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the engine and solver hot paths on seeded boards.')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to (default: standard output)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='rounds timed per benchmark')
+    parser.add_argument('-g', '--games', type=int, default=GAMES, help='games played per board')
+    parser.add_argument('-b', '--board', action='append', choices=[label for label, _, _, _ in BOARDS],
+                        help='board to benchmark, may be repeated (default: all)')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = []
+    for label, width, height, mine_count in BOARDS:
+        if args.board and label not in args.board:
+            continue
+        print('Benchmarking {}'.format(label), file=sys.stderr)
+        results.extend(bench_board(label, width, height, mine_count, args.repeat))
+        if label in GAME_BOARDS and args.games:
+            results.extend(bench_games(label, width, height, mine_count, args.games))
+
+    report = {'meta': metadata(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report)
+
+
+if __name__ == '__main__':
+    main()
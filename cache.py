@@ -0,0 +1,98 @@
+import sys
+from collections import OrderedDict
+
+from minesweeper import Cell
+
+MISSING = object()
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def component_signature(cells):
+    """Return the canonical signature of a constraint component along with its cells in canonical order.
+
+    The signature holds the position of every cell and, for every revealed cell around them, its position, the mines
+    it still misses and its hidden neighbours left, all relative to the component's corner. Two components with the
+    same signature have the same solutions, wherever they are and on whatever board.
+    """
+    ordered = sorted(cells, key=lambda cell: (cell.y, cell.x))
+    x0 = min(cell.x for cell in ordered)
+    y0 = min(cell.y for cell in ordered)
+
+    constraints = {}
+    for cell in ordered:
+        for constraining_cell in cell.get_surroundings():
+            if constraining_cell in constraints or not constraining_cell.is_revealed():
+                continue
+            if constraining_cell.status() == Cell.Status.MINE:
+                continue
+            surroundings = constraining_cell.get_surroundings()
+            flags = sum(1 for _cell in surroundings if _cell.is_flagged())
+            unknown = sum(1 for _cell in surroundings if _cell.is_playable())
+            constraints[constraining_cell] = (constraining_cell.x - x0, constraining_cell.y - y0,
+                                              constraining_cell.status() - flags, unknown)
+
+    signature = (tuple((cell.x - x0, cell.y - y0) for cell in ordered), tuple(sorted(constraints.values())))
+    return signature, ordered
+
+
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return size
+
+
+class SolutionCache(object):
+    """Least recently used cache of component solutions, bounded by an estimate of its memory use."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=MISSING):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
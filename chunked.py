@@ -0,0 +1,184 @@
+import random
+
+from core import CHUNK_BITS, CHUNK_MASK, CHUNK_SIZE, NEIGHBOUR_OFFSETS, get_cell, is_on_board
+from minesweeper import Cell, Minesweeper
+
+DEFAULT_DENSITY = 0.16
+
+MASK64 = (1 << 64) - 1
+
+
+def mine_hash(seed, x, y):
+    """Mix seed and coordinates into 64 bits, the same for the same cell of the same seed on every run."""
+    value = (seed * 0x9E3779B97F4A7C15 ^ x * 0xC2B2AE3D27D4EB4F ^ y * 0x165667B19E3779F9) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def interleave_index(x, y):
+    """Number the cells of an unbounded board, every integer coordinate pair gets its own index."""
+    x = 2 * x if x >= 0 else -2 * x - 1
+    y = 2 * y if y >= 0 else -2 * y - 1
+    return x * x + x + y if x >= y else y * y + x
+
+
+class ChunkCell(Cell):
+    __slots__ = ()
+
+    def __init__(self, game, x, y, index, has_mine, adjacent_mines):
+        # Cell numbers its cells from the width, which unbounded boards lack
+        self.game = game
+        self.x = x
+        self.y = y
+        self.index = index
+        self.has_mine = has_mine
+        self.revealed = False
+        self.flagged = False
+        self.adjacent_mines = adjacent_mines
+        self._surroundings = None
+
+
+class ChunkedMinesweeper(Minesweeper):
+    """Minesweeper whose cells are created a chunk at a time, when a chunk is first touched.
+
+    Every cell holds a mine with probability density, decided by a hash of the seed and its coordinates, so cells
+    need not exist before they are looked at and memory follows the explored area rather than the size of the
+    board. Without width and height the board is unbounded. board lists the cells created so far.
+
+    The number of mines is not known up front, remaining_mines returns None and solvers weigh their solutions by
+    the density instead. A bounded board given a mine_count rather than a density gets the same density on average.
+    """
+
+    def __init__(self, width=None, height=None, mine_count=None, density=None, seed=None, safe_cell=None,
+                 first_click_safe=False):
+        if density is None and mine_count is not None and width and height:
+            density = mine_count / (width * height)
+        if density is None:
+            density = DEFAULT_DENSITY
+        if not 0 <= density < 1:
+            raise ValueError('Mine density must lie in [0, 1), got {}'.format(density))
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.density = density
+        self.threshold = int(density * (1 << 64))
+        self.safe_cell = None
+        self.created_safe_count = 0
+        super(ChunkedMinesweeper, self).__init__(width, height, None, seed=seed, safe_cell=safe_cell,
+                                                 first_click_safe=first_click_safe)
+
+    def create_board(self):
+        self.chunks = {}
+        self.created_safe_count = 0
+        return []
+
+    def init_board(self, safe_cell=None):
+        super(ChunkedMinesweeper, self).init_board(safe_cell)
+        # The chunk of the starting cell, so that the board is never empty
+        self.get_cell(*self.start_cell())
+
+    def start_cell(self):
+        if self.width is None or self.height is None:
+            return 0, 0
+        return self.width // 2, self.height // 2
+
+    def init_mines(self, safe_cell=None):
+        # Mines follow from the hash, only those around the first reveal are taken off the cells created so far
+        self.safe_cell = safe_cell
+        self.mines_placed = True
+        if safe_cell is None:
+            return
+        for dx, dy in ((0, 0),) + NEIGHBOUR_OFFSETS:
+            x = safe_cell[0] + dx
+            y = safe_cell[1] + dy
+            if not is_on_board(x, y, self) or mine_hash(self.seed, x, y) >= self.threshold:
+                continue
+            cell = self.created_cell(x, y)
+            if cell is not None:
+                cell.has_mine = False
+                self.created_safe_count += 1
+            for _dx, _dy in NEIGHBOUR_OFFSETS:
+                neighbour = self.created_cell(x + _dx, y + _dy)
+                if neighbour is not None:
+                    neighbour.adjacent_mines -= 1
+
+    def created_cell(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_BITS, y >> CHUNK_BITS))
+        if chunk is None:
+            return None
+        return chunk[(y & CHUNK_MASK) << CHUNK_BITS | x & CHUNK_MASK]
+
+    def mine_at(self, x, y):
+        if not is_on_board(x, y, self):
+            return False
+        if self.safe_cell is not None and abs(x - self.safe_cell[0]) <= 1 and abs(y - self.safe_cell[1]) <= 1:
+            return False
+        return mine_hash(self.seed, x, y) < self.threshold
+
+    def cell_index(self, x, y):
+        if self.width is None:
+            return interleave_index(x, y)
+        return y * self.width + x
+
+    def create_chunk(self, chunk_x, chunk_y):
+        x0 = chunk_x << CHUNK_BITS
+        y0 = chunk_y << CHUNK_BITS
+        # Mines of the chunk and of a one cell margin around it, for the adjacent counts along its edges
+        mines = [[self.mine_at(x, y) for x in range(x0 - 1, x0 + CHUNK_SIZE + 1)]
+                 for y in range(y0 - 1, y0 + CHUNK_SIZE + 1)]
+        chunk = []
+        for row in range(CHUNK_SIZE):
+            above, line, below = mines[row], mines[row + 1], mines[row + 2]
+            for column in range(CHUNK_SIZE):
+                x = x0 + column
+                y = y0 + row
+                if not is_on_board(x, y, self):
+                    chunk.append(None)
+                    continue
+                adjacent_mines = (above[column] + above[column + 1] + above[column + 2] + line[column] +
+                                  line[column + 2] + below[column] + below[column + 1] + below[column + 2])
+                cell = ChunkCell(self, x, y, self.cell_index(x, y), line[column + 1], adjacent_mines)
+                chunk.append(cell)
+                self.board.append(cell)
+                if not cell.has_mine:
+                    self.created_safe_count += 1
+        self.chunks[chunk_x, chunk_y] = chunk
+        return chunk
+
+    def change_mine(self, cell, has_mine):
+        super(ChunkedMinesweeper, self).change_mine(cell, has_mine)
+        self.created_safe_count += -1 if has_mine else 1
+
+    def is_bounded(self):
+        return self.width is not None and self.height is not None
+
+    def is_won(self):
+        if not self.is_bounded() or self.revealed_count != self.created_safe_count:
+            return False
+        # Every created safe cell is revealed, the chunks never touched must hold nothing but mines
+        for chunk_y in range((self.height + CHUNK_SIZE - 1) >> CHUNK_BITS):
+            for chunk_x in range((self.width + CHUNK_SIZE - 1) >> CHUNK_BITS):
+                if (chunk_x, chunk_y) in self.chunks:
+                    continue
+                for y in range(chunk_y << CHUNK_BITS, min(self.height, (chunk_y + 1) << CHUNK_BITS)):
+                    for x in range(chunk_x << CHUNK_BITS, min(self.width, (chunk_x + 1) << CHUNK_BITS)):
+                        if not self.mine_at(x, y):
+                            return False
+        return True
+
+    def remaining_mines(self):
+        return None
+
+    def remaining_safe_cells(self):
+        return None
+
+    def mine_density(self):
+        return self.density
+
+    def playable_count(self):
+        if not self.is_bounded():
+            return None
+        return super(ChunkedMinesweeper, self).playable_count()
+
+    def get_cell(self, x, y):
+        return get_cell(x, y, self)
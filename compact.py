@@ -0,0 +1,111 @@
+from core import count_adjacent_mines, get_neighbour_table
+from minesweeper import BaseCell, Minesweeper
+
+
+class CellView(BaseCell):
+    __slots__ = ('game', 'index')
+
+    def __init__(self, game, index):
+        self.game = game
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, CellView) and self.index == other.index and self.game is other.game
+
+    def __hash__(self):
+        return self.index
+
+    @property
+    def x(self):
+        return self.index % self.game.width
+
+    @property
+    def y(self):
+        return self.index // self.game.width
+
+    @property
+    def has_mine(self):
+        return bool(self.game.mines[self.index])
+
+    @has_mine.setter
+    def has_mine(self, value):
+        self.game.mines[self.index] = value
+
+    @property
+    def revealed(self):
+        return bool(self.game.revealed[self.index])
+
+    @revealed.setter
+    def revealed(self, value):
+        self.game.revealed[self.index] = value
+
+    @property
+    def flagged(self):
+        return bool(self.game.flagged[self.index])
+
+    @flagged.setter
+    def flagged(self, value):
+        self.game.flagged[self.index] = value
+
+    @property
+    def adjacent_mines(self):
+        return self.game.adjacent_mines[self.index]
+
+    @adjacent_mines.setter
+    def adjacent_mines(self, value):
+        self.game.adjacent_mines[self.index] = value
+
+    def get_surroundings(self):
+        game = self.game
+        return [CellView(game, index) for index in game.neighbour_table[self.index]]
+
+
+class CompactBoard(object):
+    def __init__(self, game):
+        self.game = game
+
+    def __len__(self):
+        return self.game.width * self.game.height
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('board index out of range')
+        return CellView(self.game, index)
+
+    def __iter__(self):
+        game = self.game
+        for index in range(len(self)):
+            yield CellView(game, index)
+
+
+class CompactMinesweeper(Minesweeper):
+    """Minesweeper storing the board in flat byte arrays, cells are views created on demand."""
+
+    def __init__(self, width=10, height=10, mine_count=10, **kwargs):
+        self.mines = None
+        self.revealed = None
+        self.flagged = None
+        self.adjacent_mines = None
+        self.neighbour_table = None
+        super(CompactMinesweeper, self).__init__(width, height, mine_count, **kwargs)
+
+    def create_board(self):
+        board_size = self.width * self.height
+        self.mines = bytearray(board_size)
+        self.revealed = bytearray(board_size)
+        self.flagged = bytearray(board_size)
+        self.adjacent_mines = bytearray(board_size)
+        self.neighbour_table = get_neighbour_table(self.width, self.height)
+        return CompactBoard(self)
+
+    def set_mines(self, mines):
+        self.mines = bytearray(self.width * self.height)
+        for mine_index in mines:
+            self.mines[mine_index] = 1
+        self.adjacent_mines = count_adjacent_mines(self.width, self.height, mines)
+        self.mines_placed = True
+
+    def get_cell(self, x, y):
+        return CellView(self, y * self.width + x)
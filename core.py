@@ -1,12 +1,102 @@
+from bisect import bisect_right
+from functools import lru_cache
+
+NEIGHBOUR_OFFSETS = ((-1, -1), (0, -1), (1, -1),
+                     (-1, 0), (1, 0),
+                     (-1, 1), (0, 1), (1, 1))
+
+# Chunked boards create their cells in square chunks of CHUNK_SIZE cells a side
+CHUNK_BITS = 5
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+
+def get_neighbour_indices(index, width, height):
+    x = index % width
+    y = index // width
+    return [index + dy * width + dx
+            for dx, dy in NEIGHBOUR_OFFSETS
+            if 0 <= x + dx < width and 0 <= y + dy < height]
+
+
+class NeighbourTable(object):
+    """Neighbour indices of the cells of a board, from the offsets shared by cells of the same kind.
+
+    A cell lies on the first, an inner or the last row, and on the first, an inner or the last column. Cells of
+    the same kind have their neighbours at the same offsets from their own index, so only these nine patterns are
+    kept, whatever the size of the board.
+    """
+
+    __slots__ = ('width', 'height', 'patterns')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # One cell of each kind, those of a single row or column being first and last at once
+        columns = (0, min(1, width - 1), width - 1)
+        rows = (0, min(1, height - 1), height - 1)
+        self.patterns = [[tuple(dy * width + dx for dx, dy in NEIGHBOUR_OFFSETS
+                                if 0 <= x + dx < width and 0 <= y + dy < height)
+                          for x in columns]
+                         for y in rows]
+
+    def __getitem__(self, index):
+        y, x = divmod(index, self.width)
+        row = self.patterns[0 if y == 0 else 2 if y == self.height - 1 else 1]
+        return [index + offset for offset in row[0 if x == 0 else 2 if x == self.width - 1 else 1]]
+
+
+@lru_cache(maxsize=64)
+def get_neighbour_table(width, height):
+    # Shared by every board of the same size
+    return NeighbourTable(width, height)
+
+
+def place_mines(width, height, mine_count, rng, safe_cell=None):
+    board_size = width * height
+    excluded = []
+    if safe_cell is not None:
+        safe_index = safe_cell[1] * width + safe_cell[0]
+        excluded = sorted([safe_index] + get_neighbour_indices(safe_index, width, height))
+        if mine_count > board_size - len(excluded):
+            # Dense boards only keep the clicked cell safe
+            excluded = [safe_index]
+    if mine_count > board_size - len(excluded):
+        raise ValueError('Cannot place {} mines on a {}x{} board'.format(mine_count, width, height))
+
+    mines = rng.sample(range(board_size - len(excluded)), mine_count)
+    if excluded:
+        # Shift each drawn rank past the excluded indices lying at or before it
+        gaps = [excluded_index - position for position, excluded_index in enumerate(excluded)]
+        mines = [mine_index + bisect_right(gaps, mine_index) for mine_index in mines]
+    return mines
+
+
+def count_adjacent_mines(width, height, mines):
+    counts = bytearray(width * height)
+    table = get_neighbour_table(width, height)
+    for mine_index in mines:
+        for index in table[mine_index]:
+            counts[index] += 1
+    return counts
+
+
+def is_on_board(x, y, game):
+    # Unbounded boards have no width nor height
+    return (game.width is None or 0 <= x < game.width) and (game.height is None or 0 <= y < game.height)
+
+
 def get_surroundings(x, y, game):
-    coords = [(x - 1, y - 1), (x, y - 1), (x + 1, y - 1),
-              (x - 1, y), (x + 1, y),
-              (x - 1, y + 1), (x, y + 1), (x + 1, y + 1)]
-    cells = [get_cell(_x, _y, game)
-             for _x, _y in coords
-             if 0 <= _x < game.width and 0 <= _y < game.height]
-    return cells
+    if game.chunks is not None:
+        return [get_cell(x + dx, y + dy, game) for dx, dy in NEIGHBOUR_OFFSETS if is_on_board(x + dx, y + dy, game)]
+    board = game.board
+    return [board[_index] for _index in get_neighbour_table(game.width, game.height)[y * game.width + x]]
 
 
 def get_cell(x, y, game):
+    if game.chunks is not None:
+        chunk = game.chunks.get((x >> CHUNK_BITS, y >> CHUNK_BITS))
+        if chunk is None:
+            chunk = game.create_chunk(x >> CHUNK_BITS, y >> CHUNK_BITS)
+        return chunk[(y & CHUNK_MASK) << CHUNK_BITS | x & CHUNK_MASK]
     return game.board[y * game.width + x]
@@ -0,0 +1,133 @@
+from math import gcd
+
+from frontier import UnionFind
+
+
+def build_equations(constraint_cells):
+    """Turn every revealed number into the set of its hidden neighbours and the number of mines among them."""
+    equations = []
+    for cell in constraint_cells:
+        surroundings = cell.get_surroundings()
+        unknown = frozenset(_cell for _cell in surroundings if _cell.is_playable())
+        if unknown:
+            flags = sum(1 for _cell in surroundings if _cell.is_flagged())
+            equations.append((unknown, cell.status() - flags))
+    return equations
+
+
+def compare_pairs(equations, found_mines, found_safes):
+    """Reason on every pair of overlapping equations, which covers subsets and the 1-2-1 family of patterns."""
+    by_cell = {}
+    for position, (cells, _) in enumerate(equations):
+        for cell in cells:
+            by_cell.setdefault(cell, []).append(position)
+
+    seen = set()
+    for positions in by_cell.values():
+        for first in positions:
+            for second in positions:
+                if first == second or (first, second) in seen:
+                    continue
+                seen.add((first, second))
+                cells, mines = equations[first]
+                other_cells, other_mines = equations[second]
+                shared = cells & other_cells
+                only_other = other_cells - cells
+                if not only_other:
+                    continue
+                # Bounds on the mines shared by both, from the first equation alone
+                shared_low = max(0, mines - len(cells - shared))
+                shared_high = min(mines, len(shared))
+                if other_mines - shared_low == 0:
+                    found_safes.update(only_other)
+                elif other_mines - shared_high == len(only_other):
+                    found_mines.update(only_other)
+
+
+def eliminate(equations):
+    """Reduce the equations to echelon form with integer row operations."""
+    variables = sorted(set(cell for cells, _ in equations for cell in cells), key=lambda cell: cell.index)
+    order = {cell: position for position, cell in enumerate(variables)}
+
+    pivots = []
+    for cells, mines in equations:
+        row = {cell: 1 for cell in cells}
+        value = mines
+        for pivot, pivot_row, pivot_value in pivots:
+            factor = row.get(pivot)
+            if factor:
+                row, value = combine(row, value, pivot_row, pivot_value, pivot)
+        if not row:
+            continue
+
+        pivot = min(row, key=order.get)
+        reduced = []
+        for other_pivot, other_row, other_value in pivots:
+            if pivot in other_row:
+                other_row, other_value = combine(other_row, other_value, row, value, pivot)
+            reduced.append((other_pivot, other_row, other_value))
+        pivots = reduced
+        pivots.append((pivot, row, value))
+
+    return [(row, value) for _, row, value in pivots]
+
+
+def combine(row, value, pivot_row, pivot_value, pivot):
+    """Cancel the pivot out of row using pivot_row, keeping integer coefficients with no common divisor."""
+    factor = row[pivot]
+    pivot_factor = pivot_row[pivot]
+    result = {cell: coefficient * pivot_factor for cell, coefficient in row.items()}
+    for cell, coefficient in pivot_row.items():
+        result[cell] = result.get(cell, 0) - coefficient * factor
+    result = {cell: coefficient for cell, coefficient in result.items() if coefficient}
+    value = value * pivot_factor - pivot_value * factor
+
+    divisor = gcd(value, *result.values()) if result else 0
+    if divisor > 1:
+        result = {cell: coefficient // divisor for cell, coefficient in result.items()}
+        value //= divisor
+    return result, value
+
+
+def check_bounds(rows, found_mines, found_safes):
+    """Settle rows whose value can only be reached by setting every variable to its extreme."""
+    for row, value in rows:
+        low = sum(coefficient for coefficient in row.values() if coefficient < 0)
+        high = sum(coefficient for coefficient in row.values() if coefficient > 0)
+        if value == low:
+            found_mines.update(cell for cell, coefficient in row.items() if coefficient < 0)
+            found_safes.update(cell for cell, coefficient in row.items() if coefficient > 0)
+        elif value == high:
+            found_mines.update(cell for cell, coefficient in row.items() if coefficient > 0)
+            found_safes.update(cell for cell, coefficient in row.items() if coefficient < 0)
+
+
+def split_equations(equations):
+    union_find = UnionFind(cell for cells, _ in equations for cell in cells)
+    for cells, _ in equations:
+        first = next(iter(cells))
+        for cell in cells:
+            union_find.union(first, cell)
+
+    groups = {}
+    for equation in equations:
+        groups.setdefault(union_find.find(next(iter(equation[0]))), []).append(equation)
+    return list(groups.values())
+
+
+def deduce(constraint_cells):
+    """Return the cells that are certainly mines and certainly safe from the given revealed numbers."""
+    equations = build_equations(constraint_cells)
+    found_mines = set()
+    found_safes = set()
+
+    compare_pairs(equations, found_mines, found_safes)
+    if found_mines or found_safes:
+        return found_mines, found_safes
+
+    for group in split_equations(equations):
+        check_bounds(eliminate(group), found_mines, found_safes)
+
+    # A contradiction means the flags were wrong, trust neither conclusion
+    conflicting = found_mines & found_safes
+    return found_mines - conflicting, found_safes - conflicting
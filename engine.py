@@ -0,0 +1,476 @@
+import random
+from concurrent.futures import Future, wait
+from time import perf_counter
+
+from backtrack import SearchInterrupted, component_constraints
+from cache import MISSING, SolutionCache, component_signature
+from deduction import deduce
+from frontier import FrontierTracker, build_constraint_map, find_constraint_components, split_component
+from probability import ComponentCounts, local_probabilities, mine_probabilities
+from sampling import SampledCounts, sample_component
+from solvers import BacktrackSolver, solve_component
+
+STAGES = ('flag', 'reveal', 'deduce', 'constraints', 'guess')
+ALL_STAGES = STAGES + ('random',)
+
+SHUFFLE = False
+
+MAX_GROUP_SIZE = 64
+
+# Smallest group worth sending to the executor
+PARALLEL_MIN_SIZE = 16
+
+# Seconds between two calls to the interrupt callback while waiting on the executor
+INTERRUPT_POLL_INTERVAL = 0.05
+
+# Seconds a move spends counting components exactly before falling back to sampling them, and sampling them
+EXACT_TIME_BUDGET = 1.0
+SAMPLE_TIME_BUDGET = 0.5
+
+# Random draws tried to find an unconstrained cell before listing them all
+INTERIOR_SAMPLES = 32
+
+
+class MinesweeperEngine(object):
+    def __init__(self, game=None, stages=STAGES, rng=None, verbose=False, cache=None, solver=None, executor=None,
+                 batch=False):
+        self.stages = set(stages)
+        # Play every certain move found at once rather than one per step
+        self.batch = batch
+        self.rng = rng or random.Random()
+        self.verbose = verbose
+        self.cache = cache if cache is not None else SolutionCache()
+        self.solver = solver or BacktrackSolver()
+        self.executor = executor
+        # Called during long searches, which give up on the group they work on once it returns True
+        self.interrupt = None
+        # Records the time and work of every stage when set
+        self.metrics = None
+        # Search nodes visited by the executor's workers and the sampler, which self.solver does not see
+        self.other_nodes = 0
+        # Records every move along with the stage playing it when set
+        self.move_log = None
+        self.stage = None
+
+        self.game = None
+        self.board = None
+        self.deduction_count = 0
+        self.backtracking_count = 0
+        self.guess_count = 0
+        self.pending_hit_count = 0
+        self.move_count = 0
+
+        # Certain moves waiting to be played, along with the stage that found them
+        self.pending_mines = {}
+        self.pending_reveals = {}
+        self.frontier = None
+        self.deduction_version = None
+        self.constraints_version = None
+
+        if game:
+            self.set_game(game)
+
+    def set_game(self, game):
+        self.game = game
+        self.board = game.board
+        self.pending_mines.clear()
+        self.pending_reveals.clear()
+        if self.frontier:
+            self.frontier.detach()
+        self.frontier = FrontierTracker(game, worklists=('flag', 'reveal'))
+        self.deduction_version = None
+        self.constraints_version = None
+
+    def is_enabled(self, stage):
+        return stage in self.stages
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def reveal(self, cell):
+        self.move_count += 1
+        if self.move_log is not None:
+            self.move_log.record(self.game, 'reveal', cell.x, cell.y, self.stage)
+        return self.game.reveal(cell.x, cell.y)
+
+    def flag(self, cell):
+        self.move_count += 1
+        if self.move_log is not None:
+            self.move_log.record(self.game, 'flag', cell.x, cell.y, self.stage)
+        return self.game.flag(cell.x, cell.y)
+
+    def show_constrained(self, constrained, working=False):
+        pass
+
+    def is_done(self):
+        return self.game.is_won() or self.game.is_lost()
+
+    def step(self):
+        if self.metrics is None:
+            return self.play_stages()
+        self.metrics.begin_move()
+        stage = self.play_stages()
+        self.metrics.end_move(stage)
+        return stage
+
+    def play_stages(self):
+        stage = self.handle_pending_hits()
+        if stage:
+            return stage
+
+        if self.is_enabled('flag') and self.run_stage('flag', self.flag_obvious_spots):
+            return 'flag'
+
+        if self.is_enabled('reveal') and self.run_stage('reveal', self.reveal_obvious_spots):
+            return 'reveal'
+
+        if self.is_enabled('deduce') and self.run_stage('deduce', self.deduce_constraints):
+            self.deduction_count += 1
+            return 'deduce'
+
+        if self.is_enabled('constraints') and self.run_stage('constraints', self.resolve_constraints):
+            self.backtracking_count += 1
+            return 'constraints'
+
+        if self.is_enabled('guess') and self.run_stage('guess', self.guess):
+            self.guess_count += 1
+            return 'guess'
+
+        if self.is_enabled('random') and self.run_stage('random', self.random_guess):
+            self.guess_count += 1
+            return 'random'
+
+        return None
+
+    def run_stage(self, name, method):
+        stage, self.stage = self.stage, name
+        try:
+            metrics = self.metrics
+            if metrics is None:
+                return method()
+            nodes = self.solver.nodes + self.other_nodes
+            metrics.begin_stage(name)
+            try:
+                return method()
+            finally:
+                metrics.end_stage()
+                metrics.count(name, nodes=self.solver.nodes + self.other_nodes - nodes)
+        finally:
+            self.stage = stage
+
+    def play(self):
+        while not self.is_done():
+            if self.step() is None:
+                break
+        return self.game.is_won()
+
+    def queue_moves(self, mines, safes):
+        # The first stage to find a move keeps it
+        for cell in mines:
+            self.pending_mines.setdefault(cell, self.stage)
+        for cell in safes:
+            self.pending_reveals.setdefault(cell, self.stage)
+
+    def play_pending(self, play, cell, stage):
+        """Play a queued move as the stage that found it, in the move log and the metrics."""
+        self.pending_hit_count += 1
+        self.run_stage(stage, lambda: play(cell))
+
+    def handle_pending_hits(self):
+        """Play a queued move, or all of them in batch mode, and return the stage that found the first one played."""
+        if self.batch:
+            return self.handle_all_pending_hits()
+
+        while self.pending_mines:
+            cell = next(iter(self.pending_mines))
+            stage = self.pending_mines.pop(cell)
+            if not cell.is_flagged():
+                self.play_pending(self.flag, cell, stage)
+                return stage
+
+        while self.pending_reveals:
+            cell = next(iter(self.pending_reveals))
+            stage = self.pending_reveals.pop(cell)
+            if not cell.is_revealed():
+                self.play_pending(self.reveal, cell, stage)
+                return stage
+
+        return None
+
+    def handle_all_pending_hits(self):
+        played = None
+        for cell, stage in sorted(self.pending_mines.items(), key=lambda _item: _item[0].index):
+            if not cell.is_flagged():
+                self.play_pending(self.flag, cell, stage)
+                played = played or stage
+        for cell, stage in sorted(self.pending_reveals.items(), key=lambda _item: _item[0].index):
+            if not cell.is_revealed():
+                self.play_pending(self.reveal, cell, stage)
+                played = played or stage
+        self.pending_mines.clear()
+        self.pending_reveals.clear()
+        return played
+
+    def random_guess(self):
+        playable = [_cell for _cell in self.board if _cell.is_playable()]
+        if not playable:
+            return False
+        cell = self.rng.choice(playable)
+        self.log('Trying random guess: {}, {}'.format(cell.x, cell.y))
+        self.reveal(cell)
+        return True
+
+    def guess(self):
+        # Unbounded boards have no count of playable cells, and never run out of them
+        playable_count = self.game.playable_count()
+        if playable_count == 0:
+            return False
+
+        components = []
+        oversized = []
+        if self.metrics is not None:
+            self.metrics.count('guess', cells=len(self.frontier.constrained))
+        # The budgets hold for the whole move, however many components it has
+        deadline = perf_counter() + EXACT_TIME_BUDGET
+        for group in find_constraint_components(self.frontier.constrained):
+            if self.metrics is not None:
+                self.metrics.component('guess', len(group))
+            counts = self.count_group(group, deadline)
+            if counts is not None:
+                components.append(counts)
+            else:
+                oversized.append(group)
+
+        # Components too large to count are sampled, each in a share of the time left
+        dropped = []
+        deadline = perf_counter() + SAMPLE_TIME_BUDGET
+        for index, group in enumerate(oversized):
+            budget = (deadline - perf_counter()) / (len(oversized) - index)
+            sampled = self.sample_group(group, budget) if budget > 0 else None
+            if sampled is not None:
+                components.append(sampled)
+            else:
+                dropped.append(group)
+
+        # Cells of dropped components weigh as unconstrained cells in the mine count, but are no interior cells
+        counted = set(_cell for component in components for _cell in component.cells)
+        interior_count = None if playable_count is None else playable_count - len(counted)
+        probabilities, interior_probability = mine_probabilities(
+            components, self.game.remaining_mines(), interior_count, self.game.mine_density())
+        if probabilities is None:
+            return self.random_guess()
+        local = {}
+        for group in dropped:
+            local.update(local_probabilities(group))
+        probabilities.update(local)
+        if interior_count is not None and interior_count == len(local):
+            interior_probability = None
+
+        lowest = min(probabilities.values(), default=None)
+        if lowest is None or (interior_probability is not None and interior_probability < lowest):
+            cell = self.pick_interior_cell(counted.union(local))
+            lowest = interior_probability
+        else:
+            cell = self.rng.choice([_cell for _cell, probability in probabilities.items() if probability == lowest])
+
+        sampled = next((component for component in components
+                        if isinstance(component, SampledCounts) and cell in component.cells), None)
+        if cell in local:
+            self.log('Guessing {}, {} with a local mine probability of {:.3f}'.format(cell.x, cell.y, lowest))
+        elif sampled is not None:
+            self.log('Guessing {}, {} with a sampled mine probability of {:.3f} +/- {:.3f}'.format(
+                cell.x, cell.y, lowest, sampled.error(cell)))
+        else:
+            self.log('Guessing {}, {} with a mine probability of {:.3f}'.format(cell.x, cell.y, lowest))
+        self.reveal(cell)
+        return True
+
+    def pick_interior_cell(self, excluded):
+        for _ in range(INTERIOR_SAMPLES):
+            cell = self.board[self.rng.randrange(len(self.board))]
+            if cell.is_playable() and cell not in excluded:
+                return cell
+        return self.rng.choice([_cell for _cell in self.board if _cell.is_playable() and _cell not in excluded])
+
+    def flag_obvious_spots(self):
+        board = sorted(self.frontier.take('flag'), key=lambda _cell: _cell.index)
+        if self.metrics is not None:
+            self.metrics.count('flag', cells=len(board))
+        if SHUFFLE:
+            self.rng.shuffle(board)
+        for cell in board:
+            if cell not in self.frontier.constraints:
+                continue
+            playable = [_cell for _cell in cell.get_surroundings() if _cell.is_playable()]
+            flagged = [_cell for _cell in cell.get_surroundings() if _cell.is_flagged()]
+
+            if cell.status() > len(flagged) and len(playable) == cell.status() - len(flagged):
+                self.queue_moves(playable, ())
+
+        # Play one of the moves found, or all of them in batch mode
+        changed = self.handle_pending_hits()
+        if changed:
+            return True
+
+        return False
+
+    def reveal_obvious_spots(self):
+        board = sorted(self.frontier.take('reveal'), key=lambda _cell: _cell.index)
+        if self.metrics is not None:
+            self.metrics.count('reveal', cells=len(board))
+        if SHUFFLE:
+            self.rng.shuffle(board)
+        for cell in board:
+            if cell not in self.frontier.constraints:
+                continue
+            playable = [_cell for _cell in cell.get_surroundings() if _cell.is_playable()]
+            flagged = [_cell for _cell in cell.get_surroundings() if _cell.is_flagged()]
+
+            if cell.status() == len(flagged):
+                self.queue_moves((), playable)
+
+        # Play one of the moves found, or all of them in batch mode
+        changed = self.handle_pending_hits()
+        if changed:
+            return True
+
+        return False
+
+    def deduce_constraints(self):
+        if self.frontier.version == self.deduction_version:
+            return False
+        self.deduction_version = self.frontier.version
+        if self.metrics is not None:
+            self.metrics.count('deduce', cells=len(self.frontier.constraints))
+
+        mines, safes = deduce(self.frontier.constraints)
+        self.queue_moves(mines, safes)
+
+        # Play one of the moves found, or all of them in batch mode
+        return self.handle_pending_hits()
+
+    def resolve_constraints(self):
+        local_constraint_groups = self.run_stage('grouping', self.build_local_constraint_groups)
+
+        if not local_constraint_groups:
+            return False
+
+        for constrained in local_constraint_groups:
+            self.show_constrained(constrained, working=True)
+            if self.metrics is not None:
+                self.metrics.component('constraints', len(constrained))
+
+        # Every group is solved in the same pass, their moves are merged in group order
+        for certainties in self.solve_groups(local_constraint_groups):
+            if certainties:
+                self.queue_moves(*certainties)
+
+        # Play one of the moves found, or all of them in batch mode
+        return self.handle_pending_hits()
+
+    def solve_groups(self, groups):
+        """Return the mines and safe cells of every group, or None for groups without any solution.
+
+        Groups missing from the cache are solved in the executor when there is one, except the small ones, which are
+        quicker to solve here than to send away. Groups whose search is interrupted count as without any solution and
+        stay out of the cache.
+        """
+        solved = []
+        tasks = []
+        for group in groups:
+            signature, ordered = component_signature(group)
+            key = ('certainties', self.solver.name, signature)
+            certainties = self.cache.get(key)
+            if certainties is MISSING:
+                if self.executor is not None and len(group) >= PARALLEL_MIN_SIZE:
+                    certainties = self.executor.submit(
+                        solve_component, (self.solver.name, len(group), component_constraints(group)))
+                else:
+                    try:
+                        certainties = self.solver.certainties(group, interrupt=self.interrupt)
+                    except SearchInterrupted:
+                        solved.append((None, ordered))
+                        continue
+                tasks.append((len(solved), key, group, ordered))
+            solved.append((certainties, ordered))
+
+        for index, key, group, ordered in tasks:
+            certainties = solved[index][0]
+            if isinstance(certainties, Future):
+                try:
+                    certainties, nodes = self.wait_for(certainties)
+                except SearchInterrupted:
+                    solved[index] = (None, ordered)
+                    continue
+                self.other_nodes += nodes
+            if certainties is not None:
+                positions = {cell: position for position, cell in enumerate(ordered)}
+                certainties = tuple(tuple(sorted(positions[group[cell_index]] for cell_index in cell_indices))
+                                    for cell_indices in certainties)
+            self.cache.put(key, certainties)
+            solved[index] = (certainties, ordered)
+
+        return [None if certainties is None else [[ordered[position] for position in positions]
+                                                  for positions in certainties]
+                for certainties, ordered in solved]
+
+    def wait_for(self, future):
+        while self.interrupt is not None:
+            if wait([future], timeout=INTERRUPT_POLL_INTERVAL).done:
+                break
+            if self.interrupt():
+                future.cancel()
+                raise SearchInterrupted()
+        return future.result()
+
+    def count_group(self, group, deadline):
+        signature, ordered = component_signature(group)
+        key = ('counts', self.solver.name, signature)
+        counts = self.cache.get(key)
+        if counts is MISSING:
+            def interrupt():
+                return perf_counter() > deadline or (self.interrupt is not None and self.interrupt())
+
+            try:
+                counts = self.solver.counts(group, interrupt=interrupt)
+            except SearchInterrupted:
+                return None
+            if counts is not None:
+                group_positions = {cell: position for position, cell in enumerate(group)}
+                positions = [group_positions[cell] for cell in ordered]
+                counts = (counts.totals, {mines: [row[position] for position in positions]
+                                          for mines, row in counts.cell_totals.items()})
+            self.cache.put(key, counts)
+        if counts is None:
+            return None
+        return ComponentCounts(ordered, *counts)
+
+    def sample_group(self, group, budget):
+        # The chain weighs its solutions as if every other playable cell was unconstrained
+        playable_count = self.game.playable_count()
+        sampled, nodes = sample_component(group, self.game.remaining_mines(),
+                                          None if playable_count is None else playable_count - len(group), self.rng,
+                                          budget=budget, interrupt=self.interrupt, density=self.game.mine_density())
+        self.other_nodes += nodes
+        return sampled
+
+    def build_local_constraint_groups(self):
+        if self.frontier.version == self.constraints_version:
+            return None
+
+        self.constraints_version = self.frontier.version
+        constrained = set(self.frontier.constrained)
+        if self.metrics is not None:
+            self.metrics.count('grouping', cells=len(constrained))
+
+        self.show_constrained(constrained)
+
+        constraint_map = build_constraint_map(constrained)
+        local_constraint_groups = []
+        for component in find_constraint_components(constrained, constraint_map):
+            local_constraint_groups.extend(split_component(component, MAX_GROUP_SIZE, constraint_map))
+
+        local_constraint_groups = sorted(local_constraint_groups, key=lambda x: len(x), reverse=True)
+
+        return local_constraint_groups
@@ -0,0 +1,183 @@
+from collections import deque
+
+
+class UnionFind(object):
+    def __init__(self, items=()):
+        self.parents = {item: item for item in items}
+
+    def add(self, item):
+        self.parents.setdefault(item, item)
+
+    def find(self, item):
+        parents = self.parents
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    def union(self, item, other):
+        root = self.find(item)
+        other_root = self.find(other)
+        if root != other_root:
+            parents = self.parents
+            parents[other_root] = root
+        return root
+
+
+def build_constraint_map(constrained):
+    """Map every revealed cell around the constrained cells to its constrained neighbours."""
+    constraint_map = {}
+    for cell in constrained:
+        for constraining_cell in cell.get_surroundings():
+            if constraining_cell.is_revealed():
+                members = constraint_map.get(constraining_cell)
+                if members is None:
+                    members = constraint_map[constraining_cell] = []
+                members.append(cell)
+    return constraint_map
+
+
+def order_component(cells, constraint_map):
+    """Order cells breadth first through their shared constraints, so the frontier reads as a strip."""
+    cell_constraints = {cell: [constraining_cell for constraining_cell in cell.get_surroundings()
+                               if constraining_cell in constraint_map]
+                        for cell in cells}
+
+    def neighbour_count(cell):
+        return len(set(member for constraining_cell in cell_constraints[cell]
+                       for member in constraint_map[constraining_cell]))
+
+    remaining = sorted(cells, key=lambda cell: (neighbour_count(cell), cell.index))
+    ordered = []
+    visited = set()
+    for start in remaining:
+        if start in visited:
+            continue
+        visited.add(start)
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            ordered.append(cell)
+            for constraining_cell in cell_constraints[cell]:
+                for member in constraint_map[constraining_cell]:
+                    if member not in visited and member in cell_constraints:
+                        visited.add(member)
+                        queue.append(member)
+    return ordered
+
+
+def find_constraint_components(constrained, constraint_map=None):
+    """Group constrained cells sharing a revealed neighbour, transitively."""
+    constrained = sorted(constrained, key=lambda cell: cell.index)
+    if constraint_map is None:
+        constraint_map = build_constraint_map(constrained)
+
+    union_find = UnionFind(constrained)
+    for members in constraint_map.values():
+        for member in members[1:]:
+            union_find.union(members[0], member)
+
+    components = {}
+    for cell in constrained:
+        components.setdefault(union_find.find(cell), []).append(cell)
+
+    return [order_component(cells, constraint_map) for cells in components.values()]
+
+
+def split_component(component, max_size, constraint_map):
+    """Split a component in parts of at most max_size cells, cutting where the fewest constraints are shared.
+
+    Constraints crossing a cut still count the cells beyond it as unknown, so every part is a relaxation of the
+    component and the mines and safe cells found in a part hold for the whole component.
+    """
+    if len(component) <= max_size:
+        return [component]
+
+    # Components come ordered breadth first, every prefix is a contiguous stretch of the frontier
+    inside_counts = {}
+    cut = 0
+    best_length, best_cut = max_size, None
+    for length, cell in enumerate(component[:max_size], 1):
+        for constraining_cell in cell.get_surroundings():
+            members = constraint_map.get(constraining_cell)
+            if members is None or len(members) == 1:
+                continue
+            count = inside_counts.get(constraining_cell, 0) + 1
+            inside_counts[constraining_cell] = count
+            if count == 1:
+                cut += 1
+            elif count == len(members):
+                cut -= 1
+        if length >= max_size // 2 and (best_cut is None or cut <= best_cut):
+            best_length, best_cut = length, cut
+
+    part = component[:best_length]
+    rest = component[best_length:]
+    rest_map = build_constraint_map(rest)
+
+    parts = [part]
+    for cells in find_constraint_components(rest, rest_map):
+        parts.extend(split_component(cells, max_size, rest_map))
+    return parts
+
+
+class FrontierTracker(object):
+    """Follow the cell events of a game to keep its frontier up to date.
+
+    The frontier is made of the hidden cells next to a revealed one (constrained) and of the revealed numbers still
+    next to a hidden cell (constraints). Constraints whose neighbourhood changed are queued in every worklist until
+    taken, and version moves on with every change.
+    """
+
+    def __init__(self, game, worklists=()):
+        self.game = game
+        self.constrained = set()
+        self.constraints = set()
+        self.worklists = {name: set() for name in worklists}
+        self.version = 0
+
+        # Chunked boards grow as neighbours are looked up, only the cells already there are visited
+        for cell in list(game.board):
+            if cell.is_revealed():
+                self.update_constraint(cell)
+            elif cell.is_constrained():
+                self.constrained.add(cell)
+        game.add_listener(self.cell_changed)
+
+    def detach(self):
+        self.game.remove_listener(self.cell_changed)
+
+    def cell_changed(self, cell):
+        self.version += 1
+        if cell.is_revealed():
+            self.constrained.discard(cell)
+            self.update_constraint(cell)
+        else:
+            # A hidden cell that is not flagged may have been hidden again by Minesweeper.restore
+            self.constraints.discard(cell)
+            if cell.is_constrained():
+                self.constrained.add(cell)
+            else:
+                self.constrained.discard(cell)
+        hidden_again = not cell.is_revealed() and not cell.is_flagged()
+
+        for neighbour in cell.get_surroundings():
+            if neighbour.is_revealed():
+                self.update_constraint(neighbour)
+            elif cell.is_revealed() and neighbour.is_playable():
+                self.constrained.add(neighbour)
+            elif hidden_again and neighbour in self.constrained and not neighbour.is_constrained():
+                self.constrained.discard(neighbour)
+
+    def update_constraint(self, cell):
+        if cell.status() == 0 or cell.has_mine or not any(_cell.is_playable() for _cell in cell.get_surroundings()):
+            self.constraints.discard(cell)
+            return
+        self.constraints.add(cell)
+        for worklist in self.worklists.values():
+            worklist.add(cell)
+
+    def take(self, name):
+        worklist = self.worklists[name]
+        self.worklists[name] = set()
+        return worklist
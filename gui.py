@@ -1,6 +1,8 @@
-from tkinter import Menu, Label, Canvas, Tk
+import argparse
+from tkinter import Menu, Label, Canvas, PhotoImage, Tk, NW
 
-from minesweeper import Minesweeper, Cell
+from compact import CompactMinesweeper
+from minesweeper import Minesweeper, Cell, DIFFICULTIES
 
 
 class MinesweeperGui(object):
@@ -8,6 +10,10 @@ class MinesweeperGui(object):
     CELL_HEIGHT = 16
     PADDING = 5
 
+    # Boards with more cells are drawn as a single image rather than one canvas item per cell
+    BITMAP_THRESHOLD = 20000
+    BITMAP_MAX_SIZE = 1000
+
     NUM_COLORS = {
         1: 'blue',
         2: 'green',
@@ -20,6 +26,20 @@ class MinesweeperGui(object):
         'default': 'black'
     }
 
+    # Bitmap tiles show numbers by their colour alone, so none of these is used by hidden, flagged or mine tiles,
+    # the grid or the AI highlights
+    BITMAP_NUM_COLORS = {
+        1: '#A0C8FF',
+        2: '#90E090',
+        3: '#FF9CB0',
+        4: '#5060D0',
+        5: '#B07040',
+        6: '#40C0C0',
+        7: '#A040C0',
+        8: '#305030',
+        'default': '#305030'
+    }
+
     class Colors(object):
         REVEALED = 'white'
         FLAGGED = 'orange'
@@ -27,18 +47,18 @@ class MinesweeperGui(object):
         MINE = 'red'
         OUTLINE = 'black'
 
-    def __init__(self, master):
+    def __init__(self, master, bitmap=None):
         self.root = master
+        self.bitmap = bitmap
 
         self.root.title('Minesweeper')
         self.root.resizable(False, False)
 
         menubar = Menu(self.root)
         new_menu = Menu(menubar, tearoff=0)
-        new_menu.add_command(label='Easy', command=lambda: self.init_game(10, 10, 10))
-        new_menu.add_command(label='Medium', command=lambda: self.init_game(16, 16, 40))
-        new_menu.add_command(label='Hard', command=lambda: self.init_game(24, 24, 99))
-        new_menu.add_command(label='Extreme', command=lambda: self.init_game(75, 50, 650))
+        for label, width, height, mine_count in DIFFICULTIES:
+            new_menu.add_command(label=label,
+                                 command=lambda w=width, h=height, m=mine_count: self.init_game(w, h, m))
         menubar.add_cascade(label="New", menu=new_menu)
         self.root.config(menu=menubar)
 
@@ -51,6 +71,16 @@ class MinesweeperGui(object):
 
         self.game = None
         self.canvas = None
+        self.image = None
+        self.cell_width = self.CELL_WIDTH
+        self.cell_height = self.CELL_HEIGHT
+        self.object_ids = None
+        self.dirty_cells = set()
+        # Records every move played on the board when set
+        self.move_log = None
+        # Moves made by hand while the board is locked, played once it is unlocked
+        self.locked = False
+        self.held_moves = []
 
         self.init_game()
 
@@ -68,104 +98,220 @@ class MinesweeperGui(object):
         if self.canvas:
             self.canvas.grid_forget()
             self.canvas = None
+            self.image = None
 
-        self.game = Minesweeper(width, height, mine_count)
+        bitmap = self.bitmap
+        if bitmap is None:
+            bitmap = width * height > self.BITMAP_THRESHOLD
+        if bitmap:
+            size = max(1, min(self.CELL_WIDTH, self.BITMAP_MAX_SIZE // max(width, height)))
+            self.cell_width = self.cell_height = size
+        else:
+            self.cell_width = self.CELL_WIDTH
+            self.cell_height = self.CELL_HEIGHT
+
+        # Boards drawn as an image are usually too large to hold one object per cell
+        game_class = CompactMinesweeper if bitmap else Minesweeper
+        self.game = game_class(width, height, mine_count, first_click_safe=True)
+        # Canvas items of every cell, boards drawn as an image have none
+        self.object_ids = None if bitmap else [None] * len(self.game.board)
+        self.dirty_cells = set()
+        self.locked = False
+        self.held_moves = []
         self.header['text'] = 'Minesweeper'
         self.score['text'] = self.game.mine_count
 
-        canvas_width = self.CELL_WIDTH * self.game.width
-        canvas_height = self.CELL_HEIGHT * self.game.height
+        canvas_width = self.cell_width * self.game.width
+        canvas_height = self.cell_height * self.game.height
 
         self.canvas = Canvas(self.root, width=canvas_width + self.PADDING, height=canvas_height + self.PADDING)
         self.canvas.grid(row=1, columnspan=2, padx=self.PADDING, pady=self.PADDING)
+        self.canvas.bind('<Button-1>', self.left_click_callback)
+        self.canvas.bind('<Button-2>', self.right_click_callback)
+
+        if bitmap:
+            self.image = PhotoImage(width=canvas_width, height=canvas_height)
+            self.canvas.create_image(self.PADDING, self.PADDING, image=self.image, anchor=NW)
 
         self.draw_canvas()
 
     def draw_canvas(self):
-        for cell in self.game.board:
-            if cell.updated:
+        if self.image:
+            # Paint every cell hidden at once, then the grid lines, then the few cells already played
+            width = self.cell_width * self.game.width
+            height = self.cell_height * self.game.height
+            self.image.put(self.Colors.HIDDEN, to=(0, 0, width, height))
+            if self.cell_width > 2:
+                for x in range(self.game.width):
+                    self.image.put(self.Colors.OUTLINE, to=((x + 1) * self.cell_width - 1, 0,
+                                                            (x + 1) * self.cell_width, height))
+                for y in range(self.game.height):
+                    self.image.put(self.Colors.OUTLINE, to=(0, (y + 1) * self.cell_height - 1,
+                                                            width, (y + 1) * self.cell_height))
+            if self.game.playable_count() != len(self.game.board):
+                for cell in self.game.board:
+                    if not cell.is_playable():
+                        self.draw_cell(cell)
+        else:
+            for cell in self.game.board:
                 self.draw_cell(cell)
-                cell.updated = False
+        self.dirty_cells.clear()
+
+    def draw_cells(self, cells):
+        for cell in cells:
+            self.draw_cell(cell)
+        for cell in self.dirty_cells:
+            self.draw_cell(cell)
+        self.dirty_cells.clear()
+
+    def mark_dirty(self, cell):
+        self.dirty_cells.add(cell)
+
+    def highlight_cell(self, cell, color):
+        if self.image:
+            self.put_tile(cell, color)
+        else:
+            object_id = self.object_ids[cell.index][0]
+            if self.canvas.itemcget(object_id, 'fill') == color:
+                return
+            self.canvas.itemconfigure(object_id, fill=color)
+        self.mark_dirty(cell)
+
+    def put_tile(self, cell, color):
+        # Tiles keep a one pixel outline once they are large enough to show it
+        border = 1 if self.cell_width > 2 else 0
+        self.image.put(color, to=(cell.x * self.cell_width, cell.y * self.cell_height,
+                                  (cell.x + 1) * self.cell_width - border, (cell.y + 1) * self.cell_height - border))
 
     def draw_cell(self, cell):
-        if not hasattr(cell, 'object_ids'):
-            object_id = self.canvas.create_rectangle(self.PADDING + cell.x * self.CELL_WIDTH,
-                                                     self.PADDING + cell.y * self.CELL_HEIGHT,
-                                                     self.PADDING + (cell.x + 1) * self.CELL_WIDTH,
-                                                     self.PADDING + (cell.y + 1) * self.CELL_HEIGHT,
-                                                     fill=self.Colors.HIDDEN, outline=self.Colors.OUTLINE)
-            self.canvas.tag_bind(object_id, sequence='<Button-1>', func=self.left_click_callback)
-            self.canvas.tag_bind(object_id, sequence='<Button-2>', func=self.right_click_callback)
-            cell.object_ids = [object_id]
-
-        if cell.status() == Cell.Status.FLAGGED:
-            self.canvas.itemconfigure(cell.object_ids[0], fill=self.Colors.FLAGGED)
-            return
-        if cell.status() == Cell.Status.HIDDEN:
-            self.canvas.itemconfigure(cell.object_ids[0], fill=self.Colors.HIDDEN)
+        status = cell.status()
+        if status == Cell.Status.FLAGGED:
+            fill = self.Colors.FLAGGED
+        elif status == Cell.Status.HIDDEN:
+            fill = self.Colors.HIDDEN
+        elif status == Cell.Status.MINE:
+            fill = self.Colors.MINE
+        else:
+            fill = self.Colors.REVEALED
+
+        if self.image:
+            if isinstance(status, int) and status > 0:
+                fill = self.BITMAP_NUM_COLORS.get(status, self.BITMAP_NUM_COLORS['default'])
+            self.put_tile(cell, fill)
             return
 
-        if cell.status() == Cell.Status.MINE:
-            self.canvas.itemconfigure(cell.object_ids[0], fill=self.Colors.MINE)
-        elif cell.status() == 0:
-            self.canvas.itemconfigure(cell.object_ids[0], fill=self.Colors.REVEALED)
+        object_ids = self.object_ids[cell.index]
+        if object_ids is None:
+            object_id = self.canvas.create_rectangle(self.PADDING + cell.x * self.cell_width,
+                                                     self.PADDING + cell.y * self.cell_height,
+                                                     self.PADDING + (cell.x + 1) * self.cell_width,
+                                                     self.PADDING + (cell.y + 1) * self.cell_height,
+                                                     fill=fill, outline=self.Colors.OUTLINE)
+            object_ids = self.object_ids[cell.index] = [object_id]
         else:
-            self.canvas.itemconfigure(cell.object_ids[0], fill=self.Colors.REVEALED)
-            text_x = self.PADDING + cell.x * self.CELL_WIDTH + self.CELL_WIDTH / 2
-            text_y = self.PADDING + cell.y * self.CELL_HEIGHT + self.CELL_HEIGHT / 2
-            object_id = self.canvas.create_text((text_x, text_y),
-                                                text=str(cell.adjacent_mines),
-                                                fill=self.NUM_COLORS.get(cell.status(),
-                                                                         self.NUM_COLORS['default']))
-            self.canvas.tag_bind(object_id, sequence='<Button-1>', func=self.left_click_callback)
-            self.canvas.tag_bind(object_id, sequence='<Button-2>', func=self.right_click_callback)
-            cell.object_ids.append(object_id)
+            self.canvas.itemconfigure(object_ids[0], fill=fill)
+
+        if isinstance(status, int) and status > 0:
+            text_fill = self.NUM_COLORS.get(status, self.NUM_COLORS['default'])
+            if len(object_ids) > 1:
+                self.canvas.itemconfigure(object_ids[1], text=str(status), fill=text_fill, state='normal')
+                return
+            text_x = self.PADDING + cell.x * self.cell_width + self.cell_width / 2
+            text_y = self.PADDING + cell.y * self.cell_height + self.cell_height / 2
+            object_id = self.canvas.create_text((text_x, text_y), text=str(status), fill=text_fill)
+            object_ids.append(object_id)
+        elif len(object_ids) > 1:
+            self.canvas.itemconfigure(object_ids[1], state='hidden')
 
     def show_mines(self):
         for cell in self.game.board:
             if cell.has_mine:
-                text_x = self.PADDING + cell.x * self.CELL_WIDTH + self.CELL_WIDTH / 2
-                text_y = self.PADDING + cell.y * self.CELL_HEIGHT + self.CELL_HEIGHT / 2
+                if self.image:
+                    if not cell.revealed:
+                        self.put_tile(cell, self.Colors.OUTLINE)
+                    continue
+                text_x = self.PADDING + cell.x * self.cell_width + self.cell_width / 2
+                text_y = self.PADDING + cell.y * self.cell_height + self.cell_height / 2
                 self.canvas.create_text((text_x, text_y), text='x', fill='black')
 
     def left_click_callback(self, event):
-        object_id = event.widget.find_closest(event.x, event.y)[0]
-        cell = self.get_cell(object_id)
+        cell = self.get_cell_at(event.x, event.y)
         # print('Got left click on ', cell)
-        self.reveal(cell.x, cell.y)
+        if cell:
+            self.reveal(cell.x, cell.y)
 
     def reveal(self, x, y):
-        res = self.game.reveal(x, y)
-        if res:
-            self.draw_canvas()
+        return self.play_by_hand('reveal', x, y)
+
+    def play_by_hand(self, move, x, y):
+        if self.locked:
+            self.held_moves.append((move, x, y, 'user'))
+            return []
+        return self.play([(move, x, y, 'user')])
+
+    def lock(self):
+        """Hold the moves made by hand until unlock, while something else works on the game."""
+        self.locked = True
+
+    def unlock(self):
+        self.locked = False
+        moves, self.held_moves = self.held_moves, []
+        return self.play(moves)
+
+    def play(self, moves):
+        """Play ('reveal' or 'flag', x, y, stage) moves and redraw the cells they changed at once."""
+        changed = []
+        for move, x, y, stage in moves:
+            if self.move_log is not None:
+                self.move_log.record(self.game, move, x, y, stage)
+            if move == 'reveal':
+                changed.extend(self.game.reveal(x, y))
+            else:
+                changed.extend(self.game.flag(x, y))
+        if changed:
+            self.draw_cells(changed)
+            self.score['text'] = self.game.remaining_mines()
             if self.game.is_won():
                 self.header['text'] = 'You won!'
                 self.score['text'] = '0'
             elif self.game.is_lost():
                 self.header['text'] = 'You lost!'
                 self.show_mines()
-        return res
+        return changed
 
     def right_click_callback(self, event):
-        object_id = event.widget.find_closest(event.x, event.y)[0]
-        cell = self.get_cell(object_id)
+        cell = self.get_cell_at(event.x, event.y)
         # print('Got right click on ', cell)
-        self.flag(cell.x, cell.y)
+        if cell:
+            self.flag(cell.x, cell.y)
 
     def flag(self, x, y):
-        res = self.game.flag(x, y)
-        if res:
-            self.score['text'] = self.game.mine_count - len([cell for cell in self.game.board if cell.flagged])
-            self.draw_cell(self.game.get_cell(x, y))
+        return self.play_by_hand('flag', x, y)
 
-    def get_cell(self, object_id):
-        for cell in self.game.board:
-            if object_id in cell.object_ids:
-                return cell
-        raise Exception('{} not found in cells'.format(object_id))
+    def get_cell_at(self, x, y):
+        cell_x = int((self.canvas.canvasx(x) - self.PADDING) // self.cell_width)
+        cell_y = int((self.canvas.canvasy(y) - self.PADDING) // self.cell_height)
+        if 0 <= cell_x < self.game.width and 0 <= cell_y < self.game.height:
+            return self.game.get_cell(cell_x, cell_y)
+        return None
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Play minesweeper.')
+    parser.add_argument('size', nargs='*', type=int, metavar='N', help='width, height and mine count of the first game')
+    parser.add_argument('--bitmap', action='store_true', default=None,
+                        help='draw the board as a single image (default for boards over {} cells)'.format(
+                            MinesweeperGui.BITMAP_THRESHOLD))
+    args = parser.parse_args()
+    if args.size and len(args.size) != 3:
+        parser.error('expected a width, a height and a mine count')
+    return args
 
 
 if __name__ == '__main__':
+    args = parse_arguments()
     root = Tk()
-    gui = MinesweeperGui(root)
+    gui = MinesweeperGui(root, bitmap=args.bitmap)
+    if args.size:
+        gui.init_game(*args.size)
     root.mainloop()
@@ -0,0 +1,333 @@
+from backtrack import INTERRUPT_INTERVAL, SearchInterrupted, component_constraints
+
+# Activity growth after every conflict, recent conflicts weigh more in the choice of the next decision
+ACTIVITY_GROWTH = 1.05
+
+
+class ClauseLearningSearch(object):
+    """Conflict driven clause learning search over the mine assignments of a group of constrained cells.
+
+    Every revealed cell around the group bounds the number of mines among its members, with the members left out of
+    the group counting as unknown. Literals are numbered 2 * position + value and hold when the cell at position
+    has that value. Bounds propagate their forced cells with the assigned members as reason, and every conflict is
+    analysed to its first unique implication point into a clause that is kept for the rest of the search. interrupt
+    works as in ConstraintSearch.
+    """
+
+    def __init__(self, constrained_cells, constraints=None, interrupt=None):
+        self.cells = list(constrained_cells)
+        self.interrupt = interrupt
+        if constraints is None:
+            constraints = component_constraints(self.cells)
+        self.low = [missing - unknown for missing, unknown, _ in constraints]
+        self.high = [missing for missing, _, _ in constraints]
+        self.members = [members for _, _, members in constraints]
+        self.cell_constraints = [[] for _ in self.cells]
+        self.consistent = all(0 <= missing <= unknown for missing, unknown, _ in constraints)
+
+        for constraint, members in enumerate(self.members):
+            for position in members:
+                self.cell_constraints[position].append(constraint)
+
+        # Members outside the group can take any value, which loosens the bounds on the members inside
+        for constraint, members in enumerate(self.members):
+            self.low[constraint] = max(0, self.low[constraint] + len(members))
+            self.high[constraint] = min(self.high[constraint], len(members))
+
+        self.true_counts = [0] * len(self.members)
+        self.false_counts = [0] * len(self.members)
+        self.value = [None] * len(self.cells)
+        self.level = [0] * len(self.cells)
+        self.reason = [None] * len(self.cells)
+        self.phase = [0] * len(self.cells)
+        self.activity = [0.0] * len(self.cells)
+        self.increment = 1.0
+        self.trail = []
+        self.trail_limits = []
+        self.head = 0
+        self.clauses = []
+        self.watches = [[] for _ in range(2 * len(self.cells))]
+        self.nodes = 0
+        self.conflicts = 0
+
+        if self.consistent:
+            for constraint in range(len(self.members)):
+                if self.check_constraint(constraint) is not None:
+                    self.consistent = False
+                    break
+        if self.consistent:
+            self.consistent = self.propagate() is None
+
+    def literal_value(self, literal):
+        value = self.value[literal >> 1]
+        if value is None:
+            return None
+        return value == literal & 1
+
+    def enqueue(self, literal, reason):
+        position = literal >> 1
+        value = literal & 1
+        self.value[position] = value
+        self.level[position] = len(self.trail_limits)
+        self.reason[position] = reason
+        self.trail.append(position)
+        counts = self.true_counts if value else self.false_counts
+        for constraint in self.cell_constraints[position]:
+            counts[constraint] += 1
+
+    def count_node(self):
+        self.nodes += 1
+        if self.interrupt is not None and not self.nodes % INTERRUPT_INTERVAL and self.interrupt():
+            raise SearchInterrupted()
+
+    def new_level(self):
+        self.trail_limits.append(len(self.trail))
+
+    def backtrack(self, level):
+        if len(self.trail_limits) <= level:
+            return
+        mark = self.trail_limits[level]
+        while len(self.trail) > mark:
+            position = self.trail.pop()
+            value = self.value[position]
+            counts = self.true_counts if value else self.false_counts
+            for constraint in self.cell_constraints[position]:
+                counts[constraint] -= 1
+            self.phase[position] = value
+            self.value[position] = None
+            self.reason[position] = None
+        del self.trail_limits[level:]
+        self.head = len(self.trail)
+
+    def check_constraint(self, constraint):
+        """Force the free members of a tight constraint and return a falsified clause on a conflict."""
+        members = self.members[constraint]
+        true_count = self.true_counts[constraint]
+        free_count = len(members) - true_count - self.false_counts[constraint]
+
+        if true_count > self.high[constraint]:
+            return [2 * member for member in members if self.value[member] == 1]
+        if true_count + free_count < self.low[constraint]:
+            return [2 * member + 1 for member in members if self.value[member] == 0]
+        if not free_count:
+            return None
+
+        if true_count == self.high[constraint]:
+            value = 0
+            reason = [2 * member for member in members if self.value[member] == 1]
+        elif true_count + free_count == self.low[constraint]:
+            value = 1
+            reason = [2 * member + 1 for member in members if self.value[member] == 0]
+        else:
+            return None
+        for member in members:
+            if self.value[member] is None:
+                literal = 2 * member + value
+                self.enqueue(literal, [literal] + reason)
+        return None
+
+    def propagate(self):
+        """Propagate the assignments on the trail and return a falsified clause on a conflict."""
+        while self.head < len(self.trail):
+            position = self.trail[self.head]
+            self.head += 1
+            for constraint in self.cell_constraints[position]:
+                conflict = self.check_constraint(constraint)
+                if conflict is not None:
+                    return conflict
+
+            conflict = self.propagate_clauses(2 * position + 1 - self.value[position])
+            if conflict is not None:
+                return conflict
+        return None
+
+    def propagate_clauses(self, false_literal):
+        watchers = self.watches[false_literal]
+        kept = []
+        self.watches[false_literal] = kept
+        for index, clause_id in enumerate(watchers):
+            clause = self.clauses[clause_id]
+            if clause[0] == false_literal:
+                clause[0], clause[1] = clause[1], clause[0]
+            if self.literal_value(clause[0]):
+                kept.append(clause_id)
+                continue
+
+            for other in range(2, len(clause)):
+                if self.literal_value(clause[other]) is not False:
+                    clause[1], clause[other] = clause[other], clause[1]
+                    self.watches[clause[1]].append(clause_id)
+                    break
+            else:
+                kept.append(clause_id)
+                if self.literal_value(clause[0]) is False:
+                    kept.extend(watchers[index + 1:])
+                    return clause
+                self.enqueue(clause[0], clause)
+        return None
+
+    def analyze(self, conflict):
+        """Return the clause learned from a conflict, asserting literal first, and the level to jump back to."""
+        current_level = len(self.trail_limits)
+        seen = set()
+        learned = [None]
+        pending = 0
+        index = len(self.trail) - 1
+        clause = conflict
+        literal = None
+        while True:
+            for other in (clause if literal is None else clause[1:]):
+                position = other >> 1
+                if position in seen or not self.level[position]:
+                    continue
+                seen.add(position)
+                self.activity[position] += self.increment
+                if self.level[position] == current_level:
+                    pending += 1
+                else:
+                    learned.append(other)
+
+            while self.trail[index] not in seen:
+                index -= 1
+            position = self.trail[index]
+            index -= 1
+            pending -= 1
+            literal = 2 * position + self.value[position]
+            if not pending:
+                break
+            clause = self.reason[position]
+
+        learned[0] = literal ^ 1
+        self.increment *= ACTIVITY_GROWTH
+
+        back_level = 0
+        for other in range(1, len(learned)):
+            level = self.level[learned[other] >> 1]
+            if level > back_level:
+                back_level = level
+                learned[1], learned[other] = learned[other], learned[1]
+        return learned, back_level
+
+    def learn(self, learned):
+        if len(learned) > 1:
+            self.watches[learned[0]].append(len(self.clauses))
+            self.watches[learned[1]].append(len(self.clauses))
+            self.clauses.append(learned)
+
+    def decide(self):
+        best = None
+        for position, value in enumerate(self.value):
+            if value is None and (best is None or self.activity[position] > self.activity[best]):
+                best = position
+        return best
+
+    def search(self, assumption=None):
+        """Look for a solution, holding assumption if given, and leave it assigned when one is found."""
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if not self.trail_limits:
+                    return False
+                learned, back_level = self.analyze(conflict)
+                self.backtrack(back_level)
+                self.learn(learned)
+                self.enqueue(learned[0], learned if len(learned) > 1 else None)
+                continue
+
+            if assumption is not None:
+                holds = self.literal_value(assumption)
+                if holds is False:
+                    return False
+                if holds is None:
+                    self.count_node()
+                    self.new_level()
+                    self.enqueue(assumption, None)
+                    continue
+
+            position = self.decide()
+            if position is None:
+                return True
+            self.count_node()
+            self.new_level()
+            self.enqueue(2 * position + self.phase[position], None)
+
+    def solutions(self):
+        """Yield every solution, learning from the conflicts met on the way to prune the rest of the search."""
+        conflict = self.propagate()
+        if conflict is not None:
+            self.conflicts += 1
+            if self.trail_limits:
+                self.learn(self.analyze(conflict)[0])
+            return
+
+        position = self.decide()
+        if position is None:
+            yield self.value
+            return
+
+        level = len(self.trail_limits)
+        for value in (0, 1):
+            self.count_node()
+            self.new_level()
+            self.enqueue(2 * position + value, None)
+            yield from self.solutions()
+            self.backtrack(level)
+
+    def count(self, counts, node_limit=None):
+        """Add every solution to counts without keeping any, and return False as soon as node_limit is passed."""
+        conflict = self.propagate()
+        if conflict is not None:
+            self.conflicts += 1
+            if self.trail_limits:
+                self.learn(self.analyze(conflict)[0])
+            return True
+
+        position = self.decide()
+        if position is None:
+            counts.add(self.value)
+            return True
+
+        level = len(self.trail_limits)
+        for value in (0, 1):
+            self.count_node()
+            self.new_level()
+            self.enqueue(2 * position + value, None)
+            complete = self.count(counts, node_limit)
+            self.backtrack(level)
+            if not complete or (node_limit is not None and self.nodes > node_limit):
+                return False
+        return True
+
+    def find_solution(self):
+        solution = None
+        if self.search():
+            solution = list(self.value)
+        self.backtrack(0)
+        return solution
+
+    def find_certainties(self):
+        """Return the positions that are mines and safe in every solution, or None without any solution."""
+        if not self.consistent:
+            return None
+        solution = self.find_solution()
+        if solution is None:
+            return None
+
+        seen = [[False, False] for _ in self.cells]
+        for position, value in enumerate(solution):
+            seen[position][value] = True
+
+        for position in range(len(self.cells)):
+            for value in (0, 1):
+                if seen[position][value] or self.value[position] is not None:
+                    continue
+                # A refuted value leaves the other one learned at level zero for the queries to come
+                if self.search(2 * position + value):
+                    for _position, _value in enumerate(self.value):
+                        seen[_position][_value] = True
+                self.backtrack(0)
+
+        mines = [position for position, values in enumerate(seen) if not values[0]]
+        safes = [position for position, values in enumerate(seen) if not values[1]]
+        return mines, safes
@@ -0,0 +1,157 @@
+import json
+from math import frexp, ldexp
+from time import perf_counter
+
+
+def bucket_of(value):
+    """Return the smallest power of two at least value, fractions of one included, or 0 for values up to 0."""
+    if value <= 0:
+        return 0
+    mantissa, exponent = frexp(value)
+    if mantissa == 0.5:
+        exponent -= 1
+    return 1 << exponent if exponent >= 0 else ldexp(1, exponent)
+
+
+class Histogram(object):
+    """Counts of values in power of two buckets, along with their total, minimum and maximum.
+
+    Buckets go below one as well, so that stage times in seconds spread over them.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        bucket = bucket_of(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def as_dict(self):
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'buckets': {str(bucket): count for bucket, count in sorted(self.buckets.items())}}
+
+
+class Metrics(object):
+    """Time and work of every engine stage, move by move.
+
+    Stages may nest, the time of a stage leaves out the stages run inside it. Every move ends as a record holding,
+    for each stage run, its time in seconds, the cells it examined, the search nodes it visited and the sizes of
+    the components it worked on. Records are written as JSON lines to output if given, kept if keep_records is
+    set, and aggregated in histograms per stage.
+    """
+
+    MEASURES = ('time', 'cells', 'nodes', 'components')
+
+    def __init__(self, output=None, keep_records=False):
+        self.output = output
+        self.records = [] if keep_records else None
+        self.histograms = {}
+        self.moves = 0
+        self.move = None
+        self.stack = []
+        self.resumed = None
+
+    def begin_move(self):
+        self.move = {}
+        self.stack = []
+        self.resumed = perf_counter()
+
+    def end_move(self, stage, **fields):
+        record = dict(fields)
+        record.update({'move': self.moves, 'stage': stage, 'stages': self.move})
+        self.moves += 1
+        for name, values in self.move.items():
+            for measure in self.MEASURES:
+                value = values[measure]
+                if measure == 'components':
+                    for size in value:
+                        self.histogram(name, 'component_size').add(size)
+                    value = len(value)
+                self.histogram(name, measure).add(value)
+        self.write(record)
+        self.move = None
+
+    def write(self, record):
+        if self.output is not None:
+            self.output.write(json.dumps(record) + '\n')
+        if self.records is not None:
+            self.records.append(record)
+
+    def histogram(self, stage, measure):
+        histograms = self.histograms.setdefault(stage, {})
+        histogram = histograms.get(measure)
+        if histogram is None:
+            histogram = histograms[measure] = Histogram()
+        return histogram
+
+    def stage_values(self, name):
+        values = self.move.get(name)
+        if values is None:
+            values = self.move[name] = {'time': 0.0, 'cells': 0, 'nodes': 0, 'components': []}
+        return values
+
+    def pause(self):
+        now = perf_counter()
+        if self.stack:
+            self.stage_values(self.stack[-1])['time'] += now - self.resumed
+        self.resumed = now
+
+    def begin_stage(self, name):
+        self.pause()
+        self.stack.append(name)
+        self.stage_values(name)
+
+    def end_stage(self):
+        self.pause()
+        self.stack.pop()
+
+    def count(self, name, cells=0, nodes=0):
+        values = self.stage_values(name)
+        values['cells'] += cells
+        values['nodes'] += nodes
+
+    def component(self, name, size):
+        self.stage_values(name)['components'].append(size)
+
+    def merge(self, other):
+        self.moves += other.moves
+        for stage, histograms in other.histograms.items():
+            for measure, histogram in histograms.items():
+                self.histogram(stage, measure).merge(histogram)
+
+    def summary(self):
+        return {stage: {measure: histogram.as_dict() for measure, histogram in histograms.items()}
+                for stage, histograms in self.histograms.items()}
+
+    def format_table(self):
+        lines = ['{:<12} {:>7} {:>10} {:>9} {:>9} {:>10} {:>11} {:>11} {:>9}'.format(
+            'Stage', 'Runs', 'Total (s)', 'Mean (ms)', 'Max (ms)', 'Cells', 'Nodes', 'Components', 'Largest')]
+        for stage, histograms in sorted(self.histograms.items()):
+            time = histograms['time']
+            sizes = histograms.get('component_size')
+            lines.append('{:<12} {:>7} {:>10.3f} {:>9.3f} {:>9.3f} {:>10} {:>11} {:>11} {:>9}'.format(
+                stage, time.count, time.total, time.mean() * 1000, (time.max or 0) * 1000,
+                histograms['cells'].total, histograms['nodes'].total, histograms['components'].total,
+                sizes.max if sizes else '-'))
+        return '\n'.join(lines)
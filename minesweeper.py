@@ -1,30 +1,32 @@
 import random
+from collections import deque
 from enum import Enum
-from math import floor
 
-from core import get_surroundings
+from core import get_surroundings, place_mines, count_adjacent_mines
 
+DIFFICULTIES = (
+    ('Easy', 10, 10, 10),
+    ('Medium', 16, 16, 40),
+    ('Hard', 24, 24, 99),
+    ('Extreme', 75, 50, 650),
+)
+
+
+class BaseCell(object):
+    __slots__ = ()
 
-class Cell(object):
     class Status(Enum):
         FLAGGED = 'F'
         HIDDEN = 'H'
         MINE = 'M'
 
-    def __init__(self, game, x, y, has_mine=False, revealed=False):
-        self.game = game
-        self.x = x
-        self.y = y
-        self.has_mine = has_mine
-        self.revealed = revealed
-        self.flagged = False
-        self.adjacent_mines = 0
-        self.updated = True
-
     def __str__(self):
         return 'Cell({}, x={}, y={}, has_mine={}, revealed={}, flagged={})'.format(
             self.status(), self.x, self.y, self.has_mine, self.revealed, self.flagged)
 
+    def __hash__(self):
+        return self.index
+
     def is_revealed(self):
         return self.revealed
 
@@ -47,54 +49,113 @@ class Cell(object):
         return any(cell.revealed and cell.adjacent_mines == 0 and not cell.has_mine for cell in surroundings)
 
     def get_surroundings(self):
-        if not hasattr(self, '_surroundings'):
-            self._surroundings = get_surroundings(self.x, self.y, self.game)
-        return self._surroundings
+        raise NotImplementedError
 
     def status(self):
         if self.flagged:
-            return Cell.Status.FLAGGED
+            return BaseCell.Status.FLAGGED
         if not self.revealed:
-            return Cell.Status.HIDDEN
+            return BaseCell.Status.HIDDEN
         else:
             if self.has_mine:
-                return Cell.Status.MINE
+                return BaseCell.Status.MINE
             else:
                 return self.adjacent_mines
 
 
+class Cell(BaseCell):
+    __slots__ = ('game', 'x', 'y', 'index', 'has_mine', 'revealed', 'flagged', 'adjacent_mines', '_surroundings')
+
+    def __init__(self, game, x, y, has_mine=False, revealed=False):
+        self.game = game
+        self.x = x
+        self.y = y
+        self.index = y * game.width + x
+        self.has_mine = has_mine
+        self.revealed = revealed
+        self.flagged = False
+        self.adjacent_mines = 0
+        self._surroundings = None
+
+    def get_surroundings(self):
+        if self._surroundings is None:
+            self._surroundings = get_surroundings(self.x, self.y, self.game)
+        return self._surroundings
+
+
 class Minesweeper(object):
-    def __init__(self, width=10, height=10, mine_count=10):
+    def __init__(self, width=10, height=10, mine_count=10, seed=None, rng=None, safe_cell=None,
+                 first_click_safe=False):
         self.width = width
         self.height = height
         self.mine_count = mine_count
+        if rng is None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
+        self.first_click_safe = first_click_safe
+        self.mines_placed = False
         self.board = None
-        self.init_board()
-
-    def init_board(self):
-        self.board = []
-        remaining_mines = self.mine_count
-        board_size = self.width * self.height
-        for index in range(board_size):
-            x = index % self.width
-            y = floor(index / self.width)
-            self.board.append(Cell(self, x, y))
-
-        while remaining_mines:
-            mine_index = random.randint(0, board_size - 1)
-            while self.board[mine_index].has_mine:
-                mine_index = random.randint(0, board_size)
-            self.board[mine_index].has_mine = True
-            remaining_mines -= 1
+        self.deferred_reveals = []
+        self.revealed_count = 0
+        self.flag_count = 0
+        self.exploded_count = 0
+        self.listeners = []
+        self.changed_cells = []
+        # Maps chunk coordinates to their cells on boards created chunk by chunk
+        self.chunks = None
+        # Earlier states of the cells changed since the first snapshot, and a snapshot taken before every move since
+        self.journal = None
+        self.undo_points = []
+        self.init_board(safe_cell)
+
+    def init_board(self, safe_cell=None):
+        self.board = self.create_board()
+        self.revealed_count = 0
+        self.flag_count = 0
+        self.exploded_count = 0
+        self.deferred_reveals = []
+        self.mines_placed = False
+        self.journal = None
+        self.undo_points = []
+        # First-click-safe games place their mines on the first reveal
+        if safe_cell is not None or not self.first_click_safe:
+            self.init_mines(safe_cell)
+
+    def create_board(self):
+        return [Cell(self, index % self.width, index // self.width) for index in range(self.width * self.height)]
+
+    def init_mines(self, safe_cell=None):
+        self.set_mines(place_mines(self.width, self.height, self.mine_count, self.rng, safe_cell))
 
+    def set_mines(self, mines):
+        adjacent_mines = count_adjacent_mines(self.width, self.height, mines)
         for cell in self.board:
-            cell.adjacent_mines = self.count_adjacent_mines(cell)
+            cell.has_mine = False
+            cell.adjacent_mines = adjacent_mines[cell.index]
+        for mine_index in mines:
+            self.board[mine_index].has_mine = True
+        self.mines_placed = True
 
     def is_won(self):
-        return not any(not cell.has_mine and not cell.revealed for cell in self.board)
+        return self.remaining_safe_cells() == 0
 
     def is_lost(self):
-        return any(cell.has_mine and cell.revealed for cell in self.board)
+        return self.exploded_count > 0
+
+    def remaining_mines(self):
+        return self.mine_count - self.flag_count
+
+    def remaining_safe_cells(self):
+        return self.width * self.height - self.mine_count - self.revealed_count
+
+    def mine_density(self):
+        return self.mine_count / (self.width * self.height)
+
+    def playable_count(self):
+        return self.width * self.height - self.revealed_count - self.exploded_count - self.flag_count
 
     def get_cell(self, x, y):
         return self.board[y * self.width + x]
@@ -106,54 +167,181 @@ class Minesweeper(object):
                 count += 1
         return count
 
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, cell):
+        for listener in self.listeners:
+            listener(cell)
+
+    def open_cell(self, cell):
+        if self.journal is not None:
+            self.journal.append((cell, cell.revealed, cell.flagged, cell.has_mine))
+        cell.revealed = True
+        self.changed_cells.append(cell)
+        if cell.has_mine:
+            self.exploded_count += 1
+        else:
+            self.revealed_count += 1
+        self.notify(cell)
+
     def reveal(self, x, y):
+        undo_point = self.snapshot() if self.journal is not None else None
+        changed_cells = self.play_reveal(x, y)
+        self.add_undo_point(undo_point)
+        return changed_cells
+
+    def play_reveal(self, x, y):
+        self.changed_cells = []
         if self.is_won():
-            return False
+            return self.changed_cells
         if self.is_lost():
-            return False
+            return self.changed_cells
+        if not self.mines_placed:
+            self.init_mines((x, y))
         cell = self.get_cell(x, y)
         if cell.flagged:
-            return False
+            return self.changed_cells
         if cell.revealed:
             return self.auto_reveal_if_completed(cell)
-        cell.revealed = True
-        cell.updated = True
+        self.open_cell(cell)
         if not cell.has_mine:
-            self.auto_reveal_cells()
-        return True
+            self.auto_reveal_cells(cell)
+        return self.changed_cells
 
     def flag(self, x, y):
+        undo_point = self.snapshot() if self.journal is not None else None
+        changed_cells = self.play_flag(x, y)
+        self.add_undo_point(undo_point)
+        return changed_cells
+
+    def play_flag(self, x, y):
+        self.changed_cells = []
         if self.is_won():
-            return False
+            return self.changed_cells
         if self.is_lost():
-            return False
+            return self.changed_cells
         cell = self.get_cell(x, y)
         if cell.revealed:
-            return False
+            return self.changed_cells
+        if self.journal is not None:
+            self.journal.append((cell, cell.revealed, cell.flagged, cell.has_mine))
         cell.flagged = not cell.flagged
-        cell.updated = True
-        return True
+        self.flag_count += 1 if cell.flagged else -1
+        if not cell.flagged and cell.is_revealable():
+            # Unflagged next to an empty cell: opened along with the next safe reveal
+            self.deferred_reveals.append(cell)
+        self.changed_cells.append(cell)
+        self.notify(cell)
+        return self.changed_cells
+
+    def set_mine(self, cell, has_mine):
+        """Move a mine onto or off a cell, for lookahead over other mine layouts. The mine count is left alone."""
+        if cell.has_mine == has_mine:
+            return
+        if self.journal is not None:
+            self.journal.append((cell, cell.revealed, cell.flagged, cell.has_mine))
+        self.change_mine(cell, has_mine)
+        self.notify(cell)
+
+    def change_mine(self, cell, has_mine):
+        cell.has_mine = has_mine
+        for neighbour in cell.get_surroundings():
+            neighbour.adjacent_mines += 1 if has_mine else -1
+
+    def snapshot(self):
+        """Return a mark of the current state to restore later, every change from there on is kept until then.
+
+        Mines placed by the first reveal stay where they are when restoring to a state before it.
+        """
+        if self.journal is None:
+            self.journal = []
+        return (len(self.journal), self.revealed_count, self.flag_count, self.exploded_count,
+                list(self.deferred_reveals))
+
+    def restore(self, snapshot):
+        """Take every cell changed since snapshot back to its state then, in time proportional to their number.
+
+        Snapshots taken after snapshot are lost. The listeners hear about every cell restored, which are also
+        returned.
+        """
+        mark, revealed_count, flag_count, exploded_count, deferred_reveals = snapshot
+        journal = self.journal
+        if journal is None or len(journal) < mark:
+            raise ValueError('Snapshot was already restored past')
+        restored = []
+        for cell, revealed, flagged, has_mine in reversed(journal[mark:]):
+            cell.revealed = revealed
+            cell.flagged = flagged
+            if cell.has_mine != has_mine:
+                self.change_mine(cell, has_mine)
+            restored.append(cell)
+        del journal[mark:]
+        while self.undo_points and self.undo_points[-1][0] >= mark:
+            self.undo_points.pop()
+
+        self.revealed_count = revealed_count
+        self.flag_count = flag_count
+        self.exploded_count = exploded_count
+        self.deferred_reveals = list(deferred_reveals)
+        self.changed_cells = list(dict.fromkeys(restored))
+        for cell in self.changed_cells:
+            self.notify(cell)
+        return self.changed_cells
+
+    def add_undo_point(self, undo_point):
+        # Moves that changed nothing leave nothing to undo
+        if undo_point is not None and len(self.journal) > undo_point[0]:
+            self.undo_points.append(undo_point)
+
+    def undo(self):
+        """Take back the last reveal or flag made since the first snapshot, return the cells changed back."""
+        if not self.undo_points:
+            return []
+        return self.restore(self.undo_points.pop())
+
+    def clear_history(self):
+        """Stop keeping the changes made, earlier snapshots can no longer be restored."""
+        self.journal = None
+        self.undo_points = []
 
     def auto_reveal_if_completed(self, cell):
+        self.changed_cells = []
         surroundings = cell.get_surroundings()
         flag_count = len([cell for cell in surroundings if cell.flagged])
         if not flag_count == cell.adjacent_mines:
-            return False
+            return self.changed_cells
 
-        has_revealed = False
         unrevealed = [cell for cell in surroundings if not cell.revealed and not cell.flagged]
         for cell in unrevealed:
-            cell.revealed = True
-            cell.updated = True
+            if cell.revealed:
+                continue
+            self.open_cell(cell)
             if not cell.has_mine:
-                self.auto_reveal_cells()
-            has_revealed = True
+                self.auto_reveal_cells(cell)
+
+        return self.changed_cells
+
+    def auto_reveal_cells(self, origin):
+        queue = deque()
+        if origin.adjacent_mines == 0:
+            queue.append(origin)
 
-        return has_revealed
+        while self.deferred_reveals:
+            cell = self.deferred_reveals.pop()
+            if cell.is_revealable():
+                self.open_cell(cell)
+                if cell.adjacent_mines == 0:
+                    queue.append(cell)
 
-    def auto_reveal_cells(self):
-        while any(cell.is_revealable() for cell in self.board):
-            for cell in self.board:
-                if cell.is_revealable():
-                    cell.revealed = True
-                    cell.updated = True
+        # Cells next to an empty cell have no mine, only empty ones keep spreading
+        while queue:
+            for cell in queue.popleft().get_surroundings():
+                if cell.revealed or cell.flagged:
+                    continue
+                self.open_cell(cell)
+                if cell.adjacent_mines == 0:
+                    queue.append(cell)
@@ -0,0 +1,101 @@
+import random
+
+from core import get_neighbour_indices
+from engine import MinesweeperEngine
+from minesweeper import Minesweeper
+
+# The stages that never guess
+NO_GUESS_STAGES = ('flag', 'reveal', 'deduce', 'constraints')
+
+# Repairs tried on a layout before starting over from a new one
+MAX_REPAIRS = 500
+
+# Layouts started over from before giving up
+MAX_RESTARTS = 100
+
+
+def repair(game, frontier, protected, rng):
+    """Move mines so that a stuck constraint resolves, and return False when there is no way to.
+
+    A revealed number next to the frontier gets its hidden neighbours all cleared, or all filled if that moves fewer
+    mines, and the mines taken off or put on them go to or come from the interior, hidden cells away from every
+    revealed one. The interior is out of sight, so only the numbers around the changed cells change. Cells in
+    protected are left alone.
+    """
+    constraints = sorted(frontier.constraints, key=lambda _cell: _cell.index)
+    if not constraints:
+        return False
+    interior = [_cell for _cell in game.board
+                if _cell.is_playable() and _cell not in frontier.constrained and _cell.index not in protected]
+    free = [_cell for _cell in interior if not _cell.has_mine]
+    mined = [_cell for _cell in interior if _cell.has_mine]
+
+    for cell in rng.sample(constraints, len(constraints)):
+        unknown = [_cell for _cell in cell.get_surroundings() if _cell.is_playable() and _cell.index not in protected]
+        mines = [_cell for _cell in unknown if _cell.has_mine]
+        safes = [_cell for _cell in unknown if not _cell.has_mine]
+        clear = bool(mines) and len(free) >= len(mines)
+        fill = bool(safes) and len(mined) >= len(safes)
+        if clear and (not fill or len(mines) <= len(safes)):
+            for _cell, target in zip(mines, rng.sample(free, len(mines))):
+                game.set_mine(_cell, False)
+                game.set_mine(target, True)
+            return True
+        if fill:
+            for _cell, source in zip(safes, rng.sample(mined, len(safes))):
+                game.set_mine(_cell, True)
+                game.set_mine(source, False)
+            return True
+    return False
+
+
+def generate_mines(width, height, mine_count, first_click, rng=None):
+    """Return the mine indices of a board that deduction alone solves from first_click, the cells around it safe.
+
+    Mines start out at random. Whenever the solver gets stuck, repair moves a few mines around where it stopped
+    and the solver carries on. Moving mines changes numbers seen earlier, so a layout is only returned once the
+    solver has gone through it again from the first click without needing a repair. ValueError is raised when the
+    mines do not fit outside the cells around first_click, or when no layout is found after MAX_RESTARTS new ones.
+    """
+    rng = rng or random.Random()
+    first_index = first_click[1] * width + first_click[0]
+    protected = set([first_index] + get_neighbour_indices(first_index, width, height))
+    if not 0 <= mine_count <= width * height - len(protected):
+        raise ValueError('Cannot place {} mines on a {}x{} board without guessing'.format(mine_count, width, height))
+    engine = MinesweeperEngine(stages=NO_GUESS_STAGES, rng=rng, batch=True)
+    layout = None
+    restarts = 0
+    while restarts <= MAX_RESTARTS:
+        game = Minesweeper(width, height, mine_count, rng=rng, first_click_safe=True)
+        if layout is not None:
+            game.set_mines(layout)
+        game.reveal(*first_click)
+        engine.set_game(game)
+
+        repairs = 0
+        while not engine.play() and not game.is_lost() and repairs < MAX_REPAIRS:
+            if not repair(game, engine.frontier, protected, rng):
+                break
+            repairs += 1
+
+        if not game.is_won():
+            layout = None
+            restarts += 1
+        elif not repairs:
+            return [_cell.index for _cell in game.board if _cell.has_mine]
+        else:
+            layout = [_cell.index for _cell in game.board if _cell.has_mine]
+    raise ValueError('No layout of {} mines on a {}x{} board found solvable without guessing'.format(
+        mine_count, width, height))
+
+
+class NoGuessMinesweeper(Minesweeper):
+    """Minesweeper placing its mines so that the board can be solved from the first reveal without guessing.
+
+    Games that are not first click safe are solvable from the centre of the board.
+    """
+
+    def init_mines(self, safe_cell=None):
+        if safe_cell is None:
+            safe_cell = (self.width // 2, self.height // 2)
+        self.set_mines(generate_mines(self.width, self.height, self.mine_count, safe_cell, self.rng))
@@ -0,0 +1,129 @@
+from fractions import Fraction
+from math import comb
+
+from backtrack import ConstraintSearch, component_constraints
+
+# Search nodes allowed to count the solutions of one component
+NODE_LIMIT = 50000
+
+# Densities are rounded to fractions of at most this denominator, which keeps the weights of many mines exact and small
+DENSITY_DENOMINATOR = 1000
+
+
+class ComponentCounts(object):
+    """Solutions of a constraint component, grouped by their number of mines."""
+
+    def __init__(self, cells, totals=None, cell_totals=None):
+        self.cells = cells
+        self.totals = totals if totals is not None else {}
+        self.cell_totals = cell_totals if cell_totals is not None else {}
+
+    @property
+    def total(self):
+        return sum(self.totals.values())
+
+    def add(self, assignment):
+        mines = sum(assignment)
+        self.totals[mines] = self.totals.get(mines, 0) + 1
+        row = self.cell_totals.get(mines)
+        if row is None:
+            row = self.cell_totals[mines] = [0] * len(self.cells)
+        for position, is_mine in enumerate(assignment):
+            if is_mine:
+                row[position] += 1
+
+
+def count_component(cells, node_limit=NODE_LIMIT, search_class=ConstraintSearch, interrupt=None):
+    return count_search(search_class(cells, interrupt=interrupt), node_limit)
+
+
+def count_search(search, node_limit=NODE_LIMIT):
+    """Count the solutions of a component as the search finds them, in memory bounded by the size of the component."""
+    if not search.consistent:
+        return None
+
+    counts = ComponentCounts(search.cells)
+    if not search.count(counts, node_limit) or not counts.totals:
+        return None
+    return counts
+
+
+def convolve(distribution, totals):
+    result = {}
+    for mines, count in distribution.items():
+        for _mines, _count in totals.items():
+            result[mines + _mines] = result.get(mines + _mines, 0) + count * _count
+    return result
+
+
+def combine(distributions):
+    result = {0: 1}
+    for distribution in distributions:
+        result = convolve(result, distribution)
+    return result
+
+
+def density_odds(density):
+    """Return the odds of a mine in a cell of the given density, as a fraction."""
+    density = Fraction(density).limit_denominator(DENSITY_DENOMINATOR)
+    return density / (1 - density)
+
+
+def local_probabilities(cells):
+    """Return the highest mine probability any single constraint gives every cell, for components left uncounted."""
+    probabilities = [0.0] * len(cells)
+    for missing, unknown, members in component_constraints(cells):
+        for position in members:
+            probabilities[position] = max(probabilities[position], missing / unknown)
+    return dict(zip(cells, probabilities))
+
+
+def mine_probabilities(components, remaining_mines, interior_count, density=None):
+    """Return the mine probability of every component cell and of any unconstrained cell.
+
+    Each component contributes its solutions for every possible number of mines, and the mines left over are spread
+    over the interior cells, so a combination of solutions weighs as many ways as those mines can be placed. When
+    the number of mines is unknown, remaining_mines is None and every cell of the interior holds a mine with
+    probability density instead, a combination of solutions then weighs the odds of a mine to the number of mines.
+    """
+
+    if remaining_mines is None:
+        odds = density_odds(density)
+
+        def weight(mines):
+            return odds ** mines
+    else:
+        def weight(mines):
+            left = remaining_mines - mines
+            if left < 0 or left > interior_count:
+                return 0
+            return comb(interior_count, left)
+
+    everything = combine(component.totals for component in components)
+    total_weight = sum(count * weight(mines) for mines, count in everything.items())
+    if not total_weight:
+        return None, None
+
+    probabilities = {}
+    for index, component in enumerate(components):
+        others = combine(_component.totals for _index, _component in enumerate(components) if _index != index)
+        for mines, row in component.cell_totals.items():
+            mines_weight = sum(count * weight(mines + _mines) for _mines, count in others.items())
+            for position, count in enumerate(row):
+                cell = component.cells[position]
+                probabilities[cell] = probabilities.get(cell, 0) + count * mines_weight
+
+    # Sampled components weigh in fractions, the probabilities come out as floats all the same
+    probabilities = {cell: float(weight_sum / total_weight) for cell, weight_sum in probabilities.items()}
+
+    interior_probability = None
+    if remaining_mines is None:
+        if interior_count is None or interior_count:
+            interior_probability = float(density)
+    elif interior_count:
+        interior_weight = sum(count * comb(interior_count - 1, remaining_mines - mines - 1)
+                              for mines, count in everything.items()
+                              if 0 < remaining_mines - mines <= interior_count)
+        interior_probability = float(interior_weight / total_weight)
+
+    return probabilities, interior_probability
@@ -0,0 +1,216 @@
+import argparse
+import struct
+import sys
+from collections import Counter, namedtuple
+from time import perf_counter
+
+from engine import ALL_STAGES
+from minesweeper import Minesweeper
+from noguess import NoGuessMinesweeper
+
+FORMAT_VERSION = 1
+
+STATE_MAGIC = b'MSST'
+# Magic, version, width, height, mine count, seed, flags, wrong flags, exploded cells
+STATE_HEADER = struct.Struct('<4sBHHIQBII')
+CELL_INDEX = struct.Struct('<I')
+
+# Starts every game of a move log, followed by the version and the game header
+GAME_TAG = 0xFF
+# Width, height, mine count, seed, flags
+GAME_HEADER = struct.Struct('<HHIQB')
+# Action and stage, x, y
+MOVE = struct.Struct('<BHH')
+
+HAS_SEED = 1
+FIRST_CLICK_SAFE = 2
+MINES_PLACED = 4
+# Mines placed by NoGuessMinesweeper, which draws them from the seed differently
+NO_GUESS = 8
+
+ACTIONS = ('reveal', 'flag')
+# Moves made by hand have no stage. Queued moves are logged with the stage that found them, 'pending' only
+# appears in older logs and keeps the indices of the stages after it
+STAGE_NAMES = ('user', 'pending') + ALL_STAGES
+
+LoggedGame = namedtuple('LoggedGame', ['width', 'height', 'mine_count', 'seed', 'first_click_safe', 'no_guess',
+                                       'moves'])
+
+
+def game_flags(game):
+    return NO_GUESS if isinstance(game, NoGuessMinesweeper) else 0
+
+
+def pack_state(game):
+    """Serialize a bounded game in 2 bits per cell, along with its dimensions and seed.
+
+    The low bit of a cell holds its mine. The high bit marks a revealed safe cell or a flagged mine, the two
+    states a game in progress leaves its cells in. Flags on safe cells and revealed mines are rare and listed by
+    index after the header.
+    """
+    wrong_flags = []
+    exploded = []
+    cells = bytearray((len(game.board) + 3) // 4)
+    for index, cell in enumerate(game.board):
+        has_mine = cell.has_mine
+        if has_mine:
+            marked = cell.flagged
+            if cell.revealed:
+                exploded.append(index)
+        else:
+            marked = cell.revealed
+            if cell.flagged:
+                wrong_flags.append(index)
+        cells[index >> 2] |= (has_mine | marked << 1) << ((index & 3) << 1)
+
+    flags = ((HAS_SEED if game.seed is not None else 0) | (FIRST_CLICK_SAFE if game.first_click_safe else 0) |
+             (MINES_PLACED if game.mines_placed else 0) | game_flags(game))
+    header = STATE_HEADER.pack(STATE_MAGIC, FORMAT_VERSION, game.width, game.height, game.mine_count,
+                               game.seed or 0, flags, len(wrong_flags), len(exploded))
+    return b''.join([header] + [CELL_INDEX.pack(index) for index in wrong_flags + exploded] + [bytes(cells)])
+
+
+def unpack_state(data, game_class=None):
+    """Rebuild the game serialized by pack_state, as a game_class or else of the kind it was."""
+    (magic, version, width, height, mine_count, seed, flags, wrong_flag_count,
+     exploded_count) = STATE_HEADER.unpack_from(data)
+    if magic != STATE_MAGIC or version != FORMAT_VERSION:
+        raise ValueError('Not a game state of version {}'.format(FORMAT_VERSION))
+    offset = STATE_HEADER.size
+    indices = [CELL_INDEX.unpack_from(data, offset + position * CELL_INDEX.size)[0]
+               for position in range(wrong_flag_count + exploded_count)]
+    wrong_flags = set(indices[:wrong_flag_count])
+    exploded = set(indices[wrong_flag_count:])
+    cells = data[offset + len(indices) * CELL_INDEX.size:]
+
+    if game_class is None:
+        game_class = NoGuessMinesweeper if flags & NO_GUESS else Minesweeper
+    # A first click safe game places no mines until told which they are
+    game = game_class(width, height, mine_count, seed=seed if flags & HAS_SEED else None, first_click_safe=True)
+    game.first_click_safe = bool(flags & FIRST_CLICK_SAFE)
+    values = [cells[index >> 2] >> ((index & 3) << 1) & 3 for index in range(width * height)]
+    if flags & MINES_PLACED:
+        game.set_mines([index for index, value in enumerate(values) if value & 1])
+
+    for index, value in enumerate(values):
+        if not value & 2 and index not in wrong_flags and index not in exploded:
+            continue
+        cell = game.board[index]
+        if value & 1:
+            cell.flagged = index not in exploded
+            cell.revealed = index in exploded
+        else:
+            cell.revealed = index not in wrong_flags
+            cell.flagged = index in wrong_flags
+        if cell.flagged:
+            game.flag_count += 1
+        elif value & 1:
+            game.exploded_count += 1
+        else:
+            game.revealed_count += 1
+    return game
+
+
+class MoveLog(object):
+    """Append-only binary log of games and of every reveal and flag made in them, with the stage that made it.
+
+    Each game starts with what it takes to create it again, its dimensions, mine count, seed, whether its first
+    click is safe and whether it is a no-guess board, and every move takes five bytes after that. The mines of a
+    game follow from its seed and first reveal, so replaying the moves rebuilds any of its positions. Logs can be
+    concatenated.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.game = None
+
+    def begin_game(self, game):
+        seed = game.seed
+        if game.width is None or game.mine_count is None or not isinstance(seed, int) or not 0 <= seed < 1 << 64:
+            raise ValueError('Only bounded games with a known number of mines and an integer seed can be logged')
+        flags = (FIRST_CLICK_SAFE if game.first_click_safe else 0) | game_flags(game)
+        self.output.write(bytes((GAME_TAG, FORMAT_VERSION)) +
+                          GAME_HEADER.pack(game.width, game.height, game.mine_count, seed, flags))
+        self.game = game
+
+    def record(self, game, action, x, y, stage=None):
+        if game is not self.game:
+            self.begin_game(game)
+        self.output.write(MOVE.pack(ACTIONS.index(action) << 4 | STAGE_NAMES.index(stage or 'user'), x, y))
+
+
+def read_log(data):
+    """Yield every game of a move log, its moves as (action, x, y, stage) tuples."""
+    offset = 0
+    game = None
+    while offset < len(data):
+        if data[offset] == GAME_TAG:
+            if game is not None:
+                yield game
+            if data[offset + 1] != FORMAT_VERSION:
+                raise ValueError('Unsupported move log version {}'.format(data[offset + 1]))
+            width, height, mine_count, seed, flags = GAME_HEADER.unpack_from(data, offset + 2)
+            game = LoggedGame(width, height, mine_count, seed, bool(flags & FIRST_CLICK_SAFE),
+                              bool(flags & NO_GUESS), [])
+            offset += 2 + GAME_HEADER.size
+            continue
+        if game is None:
+            raise ValueError('Move log does not start with a game')
+        code, x, y = MOVE.unpack_from(data, offset)
+        game.moves.append((ACTIONS[code >> 4], x, y, STAGE_NAMES[code & 15]))
+        offset += MOVE.size
+    if game is not None:
+        yield game
+
+
+def replay(logged, move_count=None, game_class=None):
+    """Return the game of a move log after its first move_count moves, all of them by default."""
+    if game_class is None:
+        game_class = NoGuessMinesweeper if logged.no_guess else Minesweeper
+    game = game_class(logged.width, logged.height, logged.mine_count, seed=logged.seed,
+                      first_click_safe=logged.first_click_safe)
+    for action, x, y, _ in logged.moves[:move_count]:
+        if action == 'reveal':
+            game.reveal(x, y)
+        else:
+            game.flag(x, y)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the games of a move log without running the solver.')
+    parser.add_argument('log', help='move log to read')
+    parser.add_argument('-g', '--game', type=int, help='index of the game to replay (default: all)')
+    parser.add_argument('-m', '--moves', type=int, help='moves to replay (default: all)')
+    parser.add_argument('--state', help='file to write the packed state of the replayed game to')
+    args = parser.parse_args()
+    if args.state and args.game is None:
+        parser.error('--state needs --game')
+
+    with open(args.log, 'rb') as log:
+        games = list(read_log(log.read()))
+    if args.game is not None:
+        if not 0 <= args.game < len(games):
+            parser.error('the log holds {} games'.format(len(games)))
+        selected = [(args.game, games[args.game])]
+    else:
+        selected = list(enumerate(games))
+
+    start = perf_counter()
+    print('{:>6} {:>12} {:>11} {:>7} {:>8}  {}'.format('Game', 'Seed', 'Board', 'Moves', 'Result', 'Stages'))
+    for index, logged in selected:
+        game = replay(logged, args.moves)
+        result = 'won' if game.is_won() else 'lost' if game.is_lost() else 'open'
+        stages = Counter(stage for _, _, _, stage in logged.moves[:args.moves])
+        print('{:>6} {:>12} {:>11} {:>7} {:>8}  {}'.format(
+            index, logged.seed, '{}x{}x{}'.format(logged.width, logged.height, logged.mine_count),
+            len(logged.moves[:args.moves]), result,
+            ', '.join('{} {}'.format(stage, count) for stage, count in sorted(stages.items()))))
+        if args.state:
+            with open(args.state, 'wb') as output:
+                output.write(pack_state(game))
+    print('Replayed {} games in {:.3f}s'.format(len(selected), perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
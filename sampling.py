@@ -0,0 +1,192 @@
+from fractions import Fraction
+from math import comb, exp, lgamma, log, sqrt
+from time import perf_counter
+
+from backtrack import ConstraintSearch, SearchInterrupted, component_constraints
+from probability import ComponentCounts, density_odds
+
+# Chains run side by side from random solutions, window steps taken by each of them, and the cells resampled at
+# once in a step
+CHAINS = 4
+SAMPLE_STEPS = 500
+SAMPLE_WINDOW = 12
+
+# Steps thrown away while the chains move off their starting solutions
+BURN_IN = 100
+
+# Chains whose estimates of a cell lie further apart than this have not mixed, and their samples are thrown away
+MAX_CHAIN_SPREAD = 0.25
+
+
+class SampledCounts(ComponentCounts):
+    """Estimated solutions of a constraint component, grouped by their number of mines.
+
+    The totals are only known up to a common factor, which mine_probabilities does not need. errors holds the
+    standard error of the mine probability of every cell, taken from the spread of the estimates of the chains.
+    """
+
+    def __init__(self, cells, totals, cell_totals, samples, errors):
+        super(SampledCounts, self).__init__(cells, totals, cell_totals)
+        self.samples = samples
+        self.errors = errors
+
+    def error(self, cell):
+        return self.errors[self.cells.index(cell)]
+
+
+class Chain(object):
+    """Current solution of a chain of sample_component, and the solutions it visited by number of mines."""
+
+    def __init__(self, state):
+        self.state = state
+        self.mines = sum(state)
+        self.visits = {}
+        self.cell_visits = {}
+
+    def record(self):
+        self.visits[self.mines] = self.visits.get(self.mines, 0) + 1
+        row = self.cell_visits.get(self.mines)
+        if row is None:
+            row = self.cell_visits[self.mines] = [0] * len(self.state)
+        for position, is_mine in enumerate(self.state):
+            if is_mine:
+                row[position] += 1
+
+    def probabilities(self):
+        """Return how often every cell held a mine, as seen by this chain alone."""
+        samples = sum(self.visits.values())
+        if not samples:
+            return None
+        return [sum(row[position] for row in self.cell_visits.values()) / samples
+                for position in range(len(self.state))]
+
+
+def sample_component(cells, remaining_mines, interior_count, rng, steps=SAMPLE_STEPS, window=SAMPLE_WINDOW,
+                     budget=None, interrupt=None, density=None, chain_count=CHAINS):
+    """Estimate the solutions of a component too large to count with block Gibbs samplers.
+
+    Every step resamples a window of neighbouring cells, the rest of the component fixed, among all the solutions of
+    the window weighed by the ways to place the mines left in the interior. Solutions with m mines are visited in
+    proportion to their count times that weight, which is divided back out of the estimates. Without remaining_mines
+    the weight is the odds of a mine at the given density to the number of mines, as in mine_probabilities.
+    The estimate is returned along with the search nodes visited, which are counted when nothing is returned too.
+
+    Several chains start from random solutions, as a single chain can stay stuck among the solutions it started
+    from. The errors of the estimates come from the spread between the chains, and when the chains disagree by more
+    than MAX_CHAIN_SPREAD on any cell nothing is returned. The chains stop early, keeping what they saw, after
+    budget seconds or once interrupt returns True.
+    """
+    constraints = component_constraints(cells)
+    search = ConstraintSearch(cells, constraints, interrupt)
+    if not search.consistent:
+        return None, search.nodes
+    states = []
+    for _ in range(chain_count):
+        try:
+            state = search.find_random_solution(rng)
+        except SearchInterrupted:
+            state = None
+        if state is None:
+            return None, search.nodes
+        states.append(state)
+    chains = [Chain(state) for state in states]
+
+    cell_constraints = [[] for _ in cells]
+    for constraint, (_, _, members) in enumerate(constraints):
+        for position in members:
+            cell_constraints[position].append(constraint)
+    neighbours = [sorted(set(member for constraint in cell_constraints[position]
+                             for member in constraints[constraint][2]) - {position})
+                  for position in range(len(cells))]
+
+    if remaining_mines is None:
+        odds = density_odds(density)
+
+    def log_weight(mines):
+        if remaining_mines is None:
+            return mines * log(odds)
+        left = remaining_mines - mines
+        if left < 0 or left > interior_count:
+            return None
+        return lgamma(interior_count + 1) - lgamma(left + 1) - lgamma(interior_count - left + 1)
+
+    window = min(window, len(cells))
+
+    def advance(chain):
+        state = chain.state
+        # Grow the window from a random cell through the constraints, cells tied together move together
+        positions = [rng.randrange(len(cells))]
+        local = {positions[0]: 0}
+        for position in positions:
+            for neighbour in neighbours[position]:
+                if neighbour not in local and len(positions) < window:
+                    local[neighbour] = len(positions)
+                    positions.append(neighbour)
+
+        window_constraints = []
+        for constraint in sorted(set(_constraint for position in positions
+                                     for _constraint in cell_constraints[position])):
+            missing, unknown, members = constraints[constraint]
+            outside = [member for member in members if member not in local]
+            window_constraints.append((missing - sum(state[member] for member in outside), unknown - len(outside),
+                                       [local[member] for member in members if member in local]))
+
+        outside_mines = chain.mines - sum(state[position] for position in positions)
+        options = []
+        window_search = ConstraintSearch(positions, window_constraints)
+        for assignment in window_search.solutions():
+            options.append((list(assignment), log_weight(outside_mines + sum(assignment))))
+
+        weights = [_log_weight for _, _log_weight in options if _log_weight is not None]
+        if weights:
+            top = max(weights)
+            weights = [0.0 if _log_weight is None else exp(_log_weight - top) for _, _log_weight in options]
+        else:
+            weights = [1.0] * len(options)
+        pick = rng.random() * sum(weights)
+        for (assignment, _), weight in zip(options, weights):
+            pick -= weight
+            if pick < 0:
+                break
+        for position, is_mine in zip(positions, assignment):
+            state[position] = is_mine
+        chain.mines = outside_mines + sum(assignment)
+        return window_search.nodes
+
+    nodes = search.nodes
+    end = None if budget is None else perf_counter() + budget
+    for step in range(BURN_IN + steps):
+        if (end is not None and perf_counter() > end) or (interrupt is not None and interrupt()):
+            break
+        for chain in chains:
+            nodes += advance(chain)
+            if step >= BURN_IN and log_weight(chain.mines) is not None:
+                chain.record()
+
+    estimates = [chain.probabilities() for chain in chains]
+    if None in estimates:
+        return None, nodes
+    errors = []
+    for position in range(len(cells)):
+        values = [estimate[position] for estimate in estimates]
+        if max(values) - min(values) > MAX_CHAIN_SPREAD:
+            return None, nodes
+        mean = sum(values) / len(values)
+        errors.append(sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1) / len(values)))
+
+    visits = {}
+    cell_visits = {}
+    for chain in chains:
+        for _mines, count in chain.visits.items():
+            visits[_mines] = visits.get(_mines, 0) + count
+            row = cell_visits.setdefault(_mines, [0] * len(cells))
+            for position, _count in enumerate(chain.cell_visits[_mines]):
+                row[position] += _count
+
+    if remaining_mines is None:
+        weights = {_mines: odds ** _mines for _mines in visits}
+    else:
+        weights = {_mines: comb(interior_count, remaining_mines - _mines) for _mines in visits}
+    totals = {_mines: Fraction(count) / weights[_mines] for _mines, count in visits.items()}
+    cell_totals = {_mines: [Fraction(count) / weights[_mines] for count in row] for _mines, row in cell_visits.items()}
+    return SampledCounts(cells, totals, cell_totals, sum(visits.values()), errors), nodes
@@ -0,0 +1,150 @@
+import argparse
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from time import perf_counter
+
+from cache import SolutionCache
+from chunked import ChunkedMinesweeper
+from compact import CompactMinesweeper
+from engine import MinesweeperEngine, STAGES, ALL_STAGES
+from metrics import Metrics
+from replay import MoveLog
+from minesweeper import Minesweeper, DIFFICULTIES
+from noguess import NoGuessMinesweeper
+from solvers import SOLVERS
+
+BACKENDS = {
+    'standard': Minesweeper,
+    'compact': CompactMinesweeper,
+    'chunked': ChunkedMinesweeper,
+}
+
+# Shared by the games played in the same process, positions recur from one game to the next
+CACHE = SolutionCache()
+
+GameResult = namedtuple('GameResult', ['seed', 'won', 'moves', 'guesses', 'elapsed', 'metrics', 'log'])
+
+
+def play_game(task):
+    width, height, mine_count, seed, stages, backend, safe_start, solver, collect_metrics, collect_log, no_guess = task
+    start = perf_counter()
+    game_class = NoGuessMinesweeper if no_guess else BACKENDS[backend]
+    game = game_class(width, height, mine_count, seed=seed, first_click_safe=safe_start)
+    engine = MinesweeperEngine(game, stages=stages, rng=random.Random('engine-{}'.format(seed)),
+                               cache=CACHE, solver=SOLVERS[solver]())
+    if collect_metrics:
+        engine.metrics = Metrics(keep_records=True)
+    if collect_log:
+        engine.move_log = MoveLog(BytesIO())
+    won = engine.play()
+    log = engine.move_log.output.getvalue() if collect_log else None
+    return GameResult(seed, won, engine.move_count, engine.guess_count, perf_counter() - start, engine.metrics, log)
+
+
+def run_batch(width, height, mine_count, games=1000, seed=0, workers=None, stages=STAGES, backend='standard',
+              safe_start=True, solver='backtrack', metrics=None, move_log=None, no_guess=False):
+    """Play seeded games and summarize them.
+
+    The per move metrics of the games go to metrics if given, and their moves to the move_log file in seed order.
+    """
+    tasks = [(width, height, mine_count, seed + index, tuple(stages), backend, safe_start, solver,
+              metrics is not None, move_log is not None, no_guess) for index in range(games)]
+    chunksize = max(1, games // 64)
+
+    start = perf_counter()
+    if workers == 1:
+        results = list(map(play_game, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play_game, tasks, chunksize=chunksize))
+    wall_time = perf_counter() - start
+
+    if metrics is not None:
+        for result in results:
+            for record in result.metrics.records:
+                metrics.write(dict(record, seed=result.seed))
+            metrics.merge(result.metrics)
+    if move_log is not None:
+        for result in results:
+            move_log.write(result.log)
+
+    return summarize(results, wall_time)
+
+
+def summarize(results, wall_time):
+    games = len(results)
+    wins = sum(1 for result in results if result.won)
+    return {
+        'games': games,
+        'wins': wins,
+        'win_rate': wins / games if games else 0.0,
+        'mean_moves': sum(result.moves for result in results) / games if games else 0.0,
+        'mean_guesses': sum(result.guesses for result in results) / games if games else 0.0,
+        'mean_game_time': sum(result.elapsed for result in results) / games if games else 0.0,
+        'wall_time': wall_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the solver headless over batches of seeded games.')
+    parser.add_argument('-n', '--games', type=int, default=1000, help='games per difficulty')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('-d', '--difficulty', action='append',
+                        choices=[label for label, _, _, _ in DIFFICULTIES],
+                        help='difficulty to simulate, may be repeated (default: all)')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help='comma separated solver stages among {} (default: {})'.format(
+                            ','.join(ALL_STAGES), ','.join(STAGES)))
+    parser.add_argument('--unsafe-start', action='store_true', help='allow the first reveal to hit a mine')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='standard', help='board representation')
+    parser.add_argument('--no-guess', action='store_true',
+                        help='play on boards solvable without guessing from the first reveal')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='backtrack',
+                        help='solver backend for the constraint components')
+    parser.add_argument('--metrics', help='file to write the metrics of every move to as JSON lines')
+    parser.add_argument('--move-log', help='file to append the moves of every game to, see replay.py')
+    parser.add_argument('--metrics-table', action='store_true',
+                        help='print the time and work of every stage after each difficulty')
+    args = parser.parse_args()
+
+    if args.no_guess and args.backend != 'standard':
+        parser.error('--no-guess boards use the standard backend')
+    if args.move_log and args.backend == 'chunked':
+        parser.error('--move-log needs a mine count, which chunked boards do not have')
+
+    stages = [stage for stage in args.stages.split(',') if stage]
+    for stage in stages:
+        if stage not in ALL_STAGES:
+            parser.error('unknown stage: {}'.format(stage))
+
+    print('{:<10} {:>7} {:>8} {:>8} {:>9} {:>10} {:>9}'.format(
+        'Difficulty', 'Games', 'Win rate', 'Moves', 'Guesses', 'Game (ms)', 'Wall (s)'))
+    output = open(args.metrics, 'w') if args.metrics else None
+    move_log = open(args.move_log, 'ab') if args.move_log else None
+    try:
+        for label, width, height, mine_count in DIFFICULTIES:
+            if args.difficulty and label not in args.difficulty:
+                continue
+            metrics = Metrics(output) if output is not None or args.metrics_table else None
+            summary = run_batch(width, height, mine_count, args.games, args.seed, args.workers, stages,
+                                args.backend, not args.unsafe_start, args.solver, metrics, move_log,
+                                args.no_guess)
+            print('{:<10} {:>7} {:>7.1%} {:>8.1f} {:>9.2f} {:>10.2f} {:>9.2f}'.format(
+                label, summary['games'], summary['win_rate'], summary['mean_moves'],
+                summary['mean_guesses'], summary['mean_game_time'] * 1000, summary['wall_time']))
+            if args.metrics_table:
+                print()
+                print(metrics.format_table())
+                print()
+    finally:
+        if output is not None:
+            output.close()
+        if move_log is not None:
+            move_log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from backtrack import ConstraintSearch
+from learning import ClauseLearningSearch
+from probability import NODE_LIMIT, count_search
+
+
+class Solver(object):
+    """Solver backend working on one constraint component at a time.
+
+    certainties returns the positions of the cells that are mines and safe in every solution, or None without any
+    solution, and counts returns the solutions of the component grouped by their number of mines, or None when the
+    component has no solution or is too large to count. certainties may be given the constraints of the component as
+    described by component_constraints, in which case cells only needs its length. Both raise SearchInterrupted when
+    interrupt returns True during the search.
+    """
+
+    name = None
+
+    def __init__(self):
+        # Search nodes visited in this process
+        self.nodes = 0
+
+    def certainties(self, cells, constraints=None, interrupt=None):
+        raise NotImplementedError()
+
+    def counts(self, cells, node_limit=NODE_LIMIT, interrupt=None):
+        raise NotImplementedError()
+
+
+class SearchSolver(Solver):
+    search_class = None
+
+    def certainties(self, cells, constraints=None, interrupt=None):
+        search = self.search_class(cells, constraints, interrupt)
+        try:
+            return search.find_certainties()
+        finally:
+            self.nodes += search.nodes
+
+    def counts(self, cells, node_limit=NODE_LIMIT, interrupt=None):
+        search = self.search_class(cells, interrupt=interrupt)
+        try:
+            return count_search(search, node_limit)
+        finally:
+            self.nodes += search.nodes
+
+
+class BacktrackSolver(SearchSolver):
+    name = 'backtrack'
+    search_class = ConstraintSearch
+
+
+class ClauseLearningSolver(SearchSolver):
+    name = 'clause-learning'
+    search_class = ClauseLearningSearch
+
+
+SOLVERS = {
+    BacktrackSolver.name: BacktrackSolver,
+    ClauseLearningSolver.name: ClauseLearningSolver,
+}
+
+
+def solve_component(task):
+    """Entry point of the worker processes, task holds a solver name, a cell count and the component constraints.
+
+    The certainties are returned along with the search nodes visited, which the worker's solver alone sees.
+    """
+    solver_name, cell_count, constraints = task
+    solver = SOLVERS[solver_name]()
+    return solver.certainties(range(cell_count), constraints), solver.nodes
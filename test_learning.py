@@ -0,0 +1,103 @@
+import itertools
+import random
+import unittest
+
+from backtrack import ConstraintSearch, component_constraints
+from frontier import FrontierTracker, find_constraint_components
+from learning import ClauseLearningSearch
+from minesweeper import Minesweeper
+from probability import count_search
+
+MAX_GROUP_SIZE = 12
+
+
+def random_groups(count, seed=0):
+    """Yield groups of constrained cells from random positions, whole components as well as parts of them.
+
+    Some positions have wrong flags, which can leave their constraints without any solution.
+    """
+    rng = random.Random(seed)
+    produced = 0
+    while produced < count:
+        width, height = rng.randint(4, 9), rng.randint(4, 9)
+        game = Minesweeper(width, height, rng.randint(3, width * height // 4), seed=rng.getrandbits(32),
+                           first_click_safe=True)
+        game.reveal(rng.randrange(width), rng.randrange(height))
+        safes = [_cell for _cell in game.board if not _cell.has_mine and not _cell.revealed]
+        for cell in rng.sample(safes, min(len(safes), rng.randint(0, 6))):
+            game.reveal(cell.x, cell.y)
+        if rng.random() < 0.3:
+            hidden = [_cell for _cell in game.board if _cell.is_playable()]
+            if hidden:
+                cell = rng.choice(hidden)
+                game.flag(cell.x, cell.y)
+
+        tracker = FrontierTracker(game)
+        for component in find_constraint_components(tracker.constrained):
+            group = sorted(component, key=lambda _cell: _cell.index)
+            if len(group) > MAX_GROUP_SIZE:
+                group = rng.sample(group, MAX_GROUP_SIZE)
+            elif len(group) > 2 and rng.random() < 0.3:
+                group = rng.sample(group, rng.randint(1, len(group) - 1))
+            produced += 1
+            yield group
+
+
+def brute_force(cells):
+    """Return every assignment of cells allowed by their constraints, members outside the group taking any value."""
+    constraints = component_constraints(cells)
+    return [assignment for assignment in itertools.product((0, 1), repeat=len(cells))
+            if all(missing - (unknown - len(members)) <= sum(assignment[position] for position in members) <= missing
+                   for missing, unknown, members in constraints)]
+
+
+def certainties(solutions, cell_count):
+    if not solutions:
+        return None
+    mines = [position for position in range(cell_count) if all(solution[position] for solution in solutions)]
+    safes = [position for position in range(cell_count) if not any(solution[position] for solution in solutions)]
+    return mines, safes
+
+
+def counts(solutions, cell_count):
+    totals = {}
+    cell_totals = {}
+    for solution in solutions:
+        mines = sum(solution)
+        totals[mines] = totals.get(mines, 0) + 1
+        row = cell_totals.setdefault(mines, [0] * cell_count)
+        for position, is_mine in enumerate(solution):
+            row[position] += is_mine
+    return totals, cell_totals
+
+
+class ClauseLearningSearchTest(unittest.TestCase):
+    def test_find_certainties_matches_brute_force(self):
+        for group in random_groups(300):
+            expected = certainties(brute_force(group), len(group))
+            for search_class in (ClauseLearningSearch, ConstraintSearch):
+                found = search_class(group).find_certainties()
+                if found is not None:
+                    found = sorted(found[0]), sorted(found[1])
+                self.assertEqual(found, expected, search_class.__name__)
+
+    def test_count_matches_brute_force(self):
+        for group in random_groups(300, seed=1):
+            solutions = brute_force(group)
+            for search_class in (ClauseLearningSearch, ConstraintSearch):
+                found = count_search(search_class(group), node_limit=None)
+                if not solutions:
+                    self.assertIsNone(found, search_class.__name__)
+                    continue
+                self.assertEqual((found.totals, found.cell_totals), counts(solutions, len(group)),
+                                 search_class.__name__)
+
+    def test_solutions_match_brute_force(self):
+        for group in random_groups(100, seed=2):
+            search = ClauseLearningSearch(group)
+            found = sorted(tuple(solution) for solution in search.solutions()) if search.consistent else []
+            self.assertEqual(found, sorted(brute_force(group)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from minesweeper import Minesweeper
+
+
+def state(game):
+    return ([(_cell.has_mine, _cell.revealed, _cell.flagged, _cell.adjacent_mines) for _cell in game.board],
+            game.revealed_count, game.flag_count, game.exploded_count)
+
+
+def hidden_cell(game):
+    return next(_cell for _cell in game.board if _cell.is_playable())
+
+
+class UndoTest(unittest.TestCase):
+    def setUp(self):
+        self.game = Minesweeper(16, 16, 40, seed=3, first_click_safe=True)
+        self.game.reveal(8, 8)
+        self.start = self.game.snapshot()
+        self.states = [state(self.game)]
+
+    def play(self):
+        cell = hidden_cell(self.game)
+        self.game.flag(cell.x, cell.y)
+        self.states.append(state(self.game))
+
+    def test_undo_takes_back_moves_in_order(self):
+        for _ in range(3):
+            self.play()
+        for expected in reversed(self.states[:-1]):
+            self.assertTrue(self.game.undo())
+            self.assertEqual(state(self.game), expected)
+        self.assertEqual(self.game.undo(), [])
+
+    def test_moves_changing_nothing_leave_no_undo_point(self):
+        self.play()
+        revealed = next(_cell for _cell in self.game.board if _cell.revealed)
+        self.game.flag(revealed.x, revealed.y)
+        self.game.undo()
+        self.assertEqual(state(self.game), self.states[0])
+
+    def test_undo_after_restore(self):
+        self.play()
+        snapshot = self.game.snapshot()
+        self.play()
+        self.game.restore(snapshot)
+        self.assertEqual(state(self.game), self.states[1])
+
+        self.assertTrue(self.game.undo())
+        self.assertEqual(state(self.game), self.states[0])
+        self.assertEqual(self.game.undo(), [])
+
+    def test_restore_to_first_snapshot(self):
+        for _ in range(3):
+            self.play()
+        self.game.restore(self.start)
+        self.assertEqual(state(self.game), self.states[0])
+        self.assertEqual(self.game.undo(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import random
+import unittest
+from io import BytesIO
+
+from chunked import ChunkedMinesweeper
+from compact import CompactMinesweeper
+from engine import STAGES, MinesweeperEngine
+from minesweeper import Minesweeper
+from noguess import NoGuessMinesweeper
+from replay import MoveLog, pack_state, read_log, replay, unpack_state
+
+
+def state(game):
+    return ([(_cell.has_mine, _cell.revealed, _cell.flagged, _cell.adjacent_mines) for _cell in game.board],
+            game.revealed_count, game.flag_count, game.exploded_count, game.mines_placed, game.first_click_safe,
+            game.is_won(), game.is_lost())
+
+
+def play_random(game, move_log, rng, move_count):
+    """Play random reveals and flags, wrong flags and mines included, and log them with random stages."""
+    for _ in range(move_count):
+        action = 'flag' if rng.random() < 0.3 else 'reveal'
+        x, y = rng.randrange(game.width), rng.randrange(game.height)
+        move_log.record(game, action, x, y, rng.choice(['guess', 'flag', None]))
+        if action == 'reveal':
+            game.reveal(x, y)
+        else:
+            game.flag(x, y)
+
+
+def random_game(rng, game_class=Minesweeper):
+    width, height = rng.randint(3, 20), rng.randint(3, 20)
+    return game_class(width, height, rng.randint(1, width * height // 3), seed=rng.getrandbits(32),
+                      first_click_safe=rng.random() < 0.5)
+
+
+class PackStateTest(unittest.TestCase):
+    def test_round_trip(self):
+        rng = random.Random(0)
+        for game_class in (Minesweeper, CompactMinesweeper):
+            for _ in range(200):
+                game = random_game(rng, game_class)
+                play_random(game, MoveLog(BytesIO()), rng, rng.randint(0, 20))
+                self.assertEqual(state(unpack_state(pack_state(game), game_class)), state(game))
+
+    def test_mines_placed_on_unpacked_first_click(self):
+        rng = random.Random(1)
+        for game_class in (Minesweeper, NoGuessMinesweeper):
+            game = game_class(16, 16, 40, seed=rng.getrandbits(32), first_click_safe=True)
+            unpacked = unpack_state(pack_state(game))
+            self.assertIs(type(unpacked), game_class)
+            game.reveal(4, 4)
+            unpacked.reveal(4, 4)
+            self.assertEqual(state(unpacked), state(game))
+
+
+class MoveLogTest(unittest.TestCase):
+    def test_replay_round_trip(self):
+        rng = random.Random(2)
+        output = BytesIO()
+        move_log = MoveLog(output)
+        games = []
+        for _ in range(100):
+            game = random_game(rng)
+            play_random(game, move_log, rng, rng.randint(1, 30))
+            games.append(game)
+
+        logged_games = list(read_log(output.getvalue()))
+        self.assertEqual(len(logged_games), len(games))
+        for game, logged in zip(games, logged_games):
+            self.assertEqual(state(replay(logged)), state(game))
+
+    def test_partial_replay_and_stages(self):
+        rng = random.Random(3)
+        game = Minesweeper(16, 16, 40, seed=7, first_click_safe=True)
+        output = BytesIO()
+        move_log = MoveLog(output)
+        states = [state(game)]
+        moves = []
+        for _ in range(25):
+            action = 'flag' if rng.random() < 0.3 else 'reveal'
+            x, y, stage = rng.randrange(16), rng.randrange(16), rng.choice(['guess', 'reveal', None])
+            move_log.record(game, action, x, y, stage)
+            if action == 'reveal':
+                game.reveal(x, y)
+            else:
+                game.flag(x, y)
+            states.append(state(game))
+            moves.append((action, x, y, stage or 'user'))
+
+        logged, = read_log(output.getvalue())
+        self.assertEqual(logged.moves, moves)
+        for move_count in range(len(moves) + 1):
+            self.assertEqual(state(replay(logged, move_count)), states[move_count])
+
+    def test_no_guess_games_replay_on_their_own_layout(self):
+        output = BytesIO()
+        move_log = MoveLog(output)
+        game = NoGuessMinesweeper(9, 9, 10, seed=1, first_click_safe=True)
+        play_random(game, move_log, random.Random(4), 15)
+
+        logged, = read_log(output.getvalue())
+        self.assertTrue(logged.no_guess)
+        self.assertEqual(state(replay(logged)), state(game))
+
+    def test_engine_moves_are_logged_with_the_stage_finding_them(self):
+        for batch in (False, True):
+            output = BytesIO()
+            game = Minesweeper(30, 16, 99, seed=5, first_click_safe=True)
+            engine = MinesweeperEngine(game, rng=random.Random(5), batch=batch)
+            engine.move_log = MoveLog(output)
+            engine.play()
+
+            logged, = read_log(output.getvalue())
+            self.assertTrue(set(stage for _, _, _, stage in logged.moves) <= set(STAGES))
+            self.assertEqual(state(replay(logged)), state(game))
+
+    def test_chunked_games_are_refused(self):
+        with self.assertRaises(ValueError):
+            MoveLog(BytesIO()).begin_game(ChunkedMinesweeper(seed=1))
+
+
+if __name__ == '__main__':
+    unittest.main()